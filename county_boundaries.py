@@ -0,0 +1,116 @@
+"""
+County boundaries for the DESRI Opposition Tracker map
+"""
+import json
+import math
+import os
+import numpy as np
+import streamlit as st
+
+# US county boundaries (Census cartographic boundary file, pre-simplified); feature property: County ID
+COUNTY_BOUNDARIES_FILE = os.path.join('geodata', 'us_counties_simplified.geojson')
+
+# Map zoom tiers: (deepest zoom of the tier, simplification tolerance in degrees);
+# the last tier uses the bundled geometry as is
+COUNTY_ZOOM_TIERS = [(5, 0.05), (7, 0.015), (None, 0)]
+
+
+def get_zoom_tier(zoom):
+    """Index of the zoom tier a map zoom level falls into"""
+    for tier, (max_zoom, tolerance) in enumerate(COUNTY_ZOOM_TIERS):
+        if max_zoom is None or zoom <= max_zoom:
+            return tier
+    return len(COUNTY_ZOOM_TIERS) - 1
+
+
+def _douglas_peucker(points, tolerance):
+    """Boolean mask of the points of a polyline kept by Douglas-Peucker simplification"""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        inner = points[start + 1:end]
+        segment = points[end] - points[start]
+        offsets = inner - points[start]
+        length = math.hypot(segment[0], segment[1])
+        if length == 0:
+            # Closed ring: distance to the shared start/end point
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def simplify_ring(ring, tolerance, decimals):
+    """Simplified, rounded ring, or None when it collapses to fewer than 3 distinct points"""
+    points = np.asarray(ring, dtype=float)
+    simplified = np.round(points[_douglas_peucker(points, tolerance)], decimals)
+    if len(simplified) < 4:
+        return None
+    return simplified.tolist()
+
+
+def simplify_geometry(geometry, tolerance):
+    """
+    Polygon/MultiPolygon simplified to a tolerance in degrees.
+
+    Holes and islands that collapse are dropped; when every polygon collapses
+    the largest one is kept unsimplified, so each county stays on the map.
+    """
+    decimals = max(int(math.ceil(-math.log10(tolerance))) + 1, 0)
+    polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+    simplified = []
+    for polygon in polygons:
+        exterior = simplify_ring(polygon[0], tolerance, decimals)
+        if exterior is None:
+            continue
+        holes = [ring for ring in (simplify_ring(hole, tolerance, decimals) for hole in polygon[1:]) if ring]
+        simplified.append([exterior] + holes)
+    if not simplified:
+        simplified = [max(polygons, key=lambda polygon: len(polygon[0]))]
+    if len(simplified) == 1:
+        return {'type': 'Polygon', 'coordinates': simplified[0]}
+    return {'type': 'MultiPolygon', 'coordinates': simplified}
+
+
+@st.cache_resource(show_spinner=False)
+def load_county_boundaries():
+    """Bundled county boundaries as a GeoJSON FeatureCollection"""
+    with open(COUNTY_BOUNDARIES_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@st.cache_resource(max_entries=len(COUNTY_ZOOM_TIERS), show_spinner=False)
+def get_county_boundaries(tier):
+    """County boundaries simplified for a zoom tier, computed once per tier"""
+    boundaries = load_county_boundaries()
+    tolerance = COUNTY_ZOOM_TIERS[tier][1]
+    if not tolerance:
+        return boundaries
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {**feature, 'geometry': simplify_geometry(feature['geometry'], tolerance)}
+            for feature in boundaries['features']
+        ]
+    }
+
+
+def feature_bounds(features):
+    """(south, west, north, east) of each feature as an N x 4 array"""
+    bounds = np.empty((len(features), 4))
+    for i, feature in enumerate(features):
+        geometry = feature['geometry']
+        polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+        points = np.concatenate([np.asarray(polygon[0], dtype=float) for polygon in polygons])
+        bounds[i] = points[:, 1].min(), points[:, 0].min(), points[:, 1].max(), points[:, 0].max()
+    return bounds
@@ -0,0 +1,120 @@
+"""
+County name matching for the DESRI Opposition Tracker (county names -> 5-digit FIPS)
+"""
+import os
+import pandas as pd
+import streamlit as st
+
+# Census county list (County ID = 5-digit FIPS) with each county's centroid
+COUNTY_CENTROIDS_FILE = os.path.join('geodata', 'us_county_centroids.csv')
+
+# Trailing county-type words ignored when matching ("city and borough" before "borough")
+COUNTY_SUFFIXES = r'\s+(?:city and borough|census area|county|co|parish|borough|municipality|municipio|city)$'
+
+# Names the county list does not know: Alaska's 2019 split of Valdez-Cordova
+EXTRA_COUNTY_ALIASES = {
+    ('AK', 'chugach'): '02261',
+    ('AK', 'copperriver'): '02261'
+}
+
+
+@st.cache_resource(show_spinner=False)
+def load_county_centroids():
+    """County centroid table: County ID (5-digit FIPS), State, County, Latitude, Longitude"""
+    return pd.read_csv(COUNTY_CENTROIDS_FILE, dtype={'County ID': str})
+
+
+def county_fips(values):
+    """5-digit county FIPS codes from numbers or strings (leading zeros restored)"""
+    codes = pd.to_numeric(pd.Series(values), errors='coerce').astype('Int64')
+    return codes.astype('string').str.zfill(5)
+
+
+def _plain_names(names):
+    """Lower-case ASCII names with punctuation turned into spaces and 'saint' shortened to 'st'"""
+    names = pd.Series(names, dtype='string').fillna('')
+    names = names.str.normalize('NFKD').str.encode('ascii', errors='ignore').str.decode('ascii')
+    names = names.str.casefold().str.replace('&', ' and ', regex=False)
+    names = names.str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip()
+    return names.str.replace(r'\bsaint\b', 'st', regex=True)
+
+
+def normalize_county_names(names):
+    """
+    (full, base) match keys of county names.
+
+    Both ignore case, accents, punctuation and spacing ("St. Mary's" and
+    "Saint Marys" match); the base key also drops the county-type suffix.
+    """
+    plain = _plain_names(names)
+    full = plain.str.replace(' ', '', regex=False)
+    base = plain.str.replace(COUNTY_SUFFIXES, '', regex=True).str.replace(' ', '', regex=False)
+    return full, base
+
+
+def _state_codes(states, length):
+    """Upper-case, stripped state codes (one code is repeated for every name)"""
+    if isinstance(states, str):
+        return [states.strip().upper()] * length
+    return pd.Series(states).astype('string').fillna('').str.strip().str.upper().tolist()
+
+
+@st.cache_resource(show_spinner=False)
+def get_county_alias_index():
+    """
+    Hash index from (state, county key) to County ID, built once per process.
+
+    Every county is reachable by its full key ("baltimorecity") and its base key
+    ("baltimore"); when two counties share a base key the county-type one keeps
+    it over the independent city, as in everyday usage.
+    """
+    counties = load_county_centroids()
+    full, base = normalize_county_names(counties['County'])
+    is_city = counties['County'].str.endswith(' city').to_numpy()
+    index = dict(EXTRA_COUNTY_ALIASES)
+    for state, full_key, county_id in zip(counties['State'], full, counties['County ID']):
+        index.setdefault((state, full_key), county_id)
+    for prefer_cities in (False, True):
+        for state, base_key, county_id, city in zip(counties['State'], base, counties['County ID'], is_city):
+            if city == prefer_cities:
+                index.setdefault((state, base_key), county_id)
+    return index
+
+
+def resolve_counties(states, counties):
+    """County IDs of (state, county name) pairs as a string Series; <NA> where nothing matches"""
+    full, base = normalize_county_names(counties)
+    states = _state_codes(states, len(full))
+    index = get_county_alias_index()
+    return pd.Series([
+        index.get((state, full_key)) or index.get((state, base_key))
+        for state, full_key, base_key in zip(states, full, base)
+    ], index=full.index, dtype='string')
+
+
+def county_keys(states, counties):
+    """
+    One match key per (state, county): the County ID where the name resolves,
+    otherwise "ST:basekey", so unknown counties still compare consistently.
+    """
+    full, base = normalize_county_names(counties)
+    fallback = [f"{state}:{base_key}" for state, base_key in zip(_state_codes(states, len(full)), base)]
+    resolved = resolve_counties(states, counties)
+    return resolved.where(resolved.notna(), pd.array(fallback, dtype='string'))
+
+
+def county_key(state, county):
+    """Match key of one county (see county_keys)"""
+    return county_keys(state, [county]).iloc[0]
+
+
+def county_list_keys(states, county_lists):
+    """Set of match keys of each row's '|'-separated county list (e.g. multi-county restrictions)"""
+    lists = pd.Series(county_lists, dtype='string').reset_index(drop=True)
+    states = pd.Series(_state_codes(states, len(lists)))
+    names = lists.fillna('').str.split('|').explode().str.strip()
+    names = names[names != '']
+    found = [set() for _ in range(len(lists))]
+    for row, key in zip(names.index, county_keys(states[names.index].to_numpy(), names.to_numpy())):
+        found[row].add(key)
+    return found
@@ -0,0 +1,75 @@
+"""
+Background refresh of Supabase data for the DESRI Public Engagement Intelligence Hub
+"""
+import logging
+import os
+import threading
+import time
+import streamlit as st
+from supabase_config import drop_snapshots, fetch_table_rows, get_snapshot_generation, get_snapshot_time, publish_table_snapshots
+
+# Tables kept in memory and re-fetched in the background
+REFRESHED_TABLES = ['user_added_projects', 'removed_projects', 'public_hearing_qa']
+
+# How often a disabled refresher checks whether it was re-enabled
+IDLE_POLL_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def get_refresh_interval():
+    """Background refresh interval in seconds from DATA_REFRESH_INTERVAL (0 disables it)"""
+    try:
+        value = st.secrets["DATA_REFRESH_INTERVAL"]
+    except:
+        value = os.environ.get("DATA_REFRESH_INTERVAL", 0)
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def refresh_snapshots(supabase):
+    """Fetch every refreshed table and publish them together as one snapshot"""
+    generation = get_snapshot_generation()
+    tables = {table_name: fetch_table_rows(supabase, table_name) for table_name in REFRESHED_TABLES}
+    return publish_table_snapshots(tables, generation)
+
+
+def _refresh_loop(supabase):
+    """
+    Keep the snapshots fresh; on failure the previous snapshot keeps being served.
+
+    The interval is re-read every round, so a changed DATA_REFRESH_INTERVAL
+    applies to this thread. While it is 0 the snapshots are dropped and reads
+    go straight to Supabase.
+    """
+    while True:
+        interval = get_refresh_interval()
+        if not interval:
+            if get_snapshot_time() is not None:
+                drop_snapshots()
+            time.sleep(IDLE_POLL_SECONDS)
+            continue
+        try:
+            refresh_snapshots(supabase)
+        except Exception as e:
+            logger.warning("Background data refresh failed: %s", e)
+        time.sleep(interval)
+
+
+@st.cache_resource(show_spinner=False)
+def start_background_refresher(_supabase):
+    """Start the refresher thread once per process"""
+    thread = threading.Thread(target=_refresh_loop, args=(_supabase,),
+                              name='supabase-refresher', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_data_age():
+    """Seconds since the latest snapshot was published, or None while no snapshot is served"""
+    refreshed_at = get_snapshot_time()
+    if refreshed_at is None:
+        return None
+    return time.time() - refreshed_at
@@ -8,7 +8,7 @@ import base64
 from dotenv import load_dotenv
 from supabase_config import (
     init_supabase, 
-    get_user_added_projects, 
+    begin_request_cache,
     get_removed_projects,
     add_user_project,
     remove_project,
@@ -24,7 +24,40 @@ from supabase_config import (
     soft_delete_public_hearing_qa,
     restore_public_hearing_qa,
     get_removed_public_hearing_qa,
-    get_active_public_hearing_qa
+    get_active_public_hearing_qa,
+    upsert_user_projects
+)
+from tracker_data import (
+    get_dataset_version,
+    get_project_lookup,
+    get_project_names,
+    get_report_version,
+    load_data,
+    load_opposition_data,
+    refresh_project_data,
+    report_files_available,
+    get_memory_report,
+    load_survey_store,
+    get_project_survey
+)
+from spark_data import get_spark_data_version, get_spark_report_issues, lookup_spark_county
+from spark_enrichment import plan_rows, reenrich_projects, sentiment_transitions
+from spark_history import count_transitions, get_latest_sentiment_changes
+from county_matching import county_fips, county_key, county_list_keys
+from spatial_index import NEARBY_RADIUS_MILES, get_contested_index, get_project_index, get_restriction_points
+from data_refresher import get_data_age, get_refresh_interval, start_background_refresher
+from tracker_map import (
+    OPPOSITION_WEIGHTS,
+    get_cluster_layer,
+    get_clicked_project_id,
+    get_county_layer,
+    get_heatmap_layer,
+    get_map_bounds,
+    get_map_zoom,
+    get_opposition_grid,
+    get_tracker_map,
+    get_viewport_layer,
+    show_tracker_map
 )
 
 # Load environment variables
@@ -696,6 +729,20 @@ if 'page' not in locals():
 # Initialize Supabase (needed for all pages)
 supabase = init_supabase()
 
+# Each Supabase table/query is fetched at most once per rerun
+begin_request_cache()
+
+# Optional background refresh: reruns read in-memory snapshots instead of waiting on Supabase
+refresh_interval = get_refresh_interval()
+if supabase and refresh_interval:
+    start_background_refresher(supabase)
+    data_age = get_data_age()
+    with st.sidebar:
+        if data_age is None:
+            st.caption("🔄 Live data: refresh in progress, reading directly from Supabase...")
+        else:
+            st.caption(f"🔄 Live data as of {int(data_age)}s ago (refreshed every {refresh_interval}s)")
+
 if page == "Opposition Tracker":
     # Header Section - Logo centered
     try:
@@ -731,95 +778,9 @@ if page == "Opposition Tracker":
     # Add some spacing after logo
     st.markdown("<br>", unsafe_allow_html=True)
     
-    # Load data
-    @st.cache_data(ttl=1)  # Set TTL to 1 second to ensure fresh data after modifications
-    def load_data():
-        try:
-            # Try to load the processed data
-            if os.path.exists('DESRI_PowerBI_Complete.xlsx'):
-                df = pd.read_excel('DESRI_PowerBI_Complete.xlsx', sheet_name='Fact_Projects')
-            elif os.path.exists('desri_public_opps_major_tracker_with_counties_corrected.xlsx'):
-                df = pd.read_excel('desri_public_opps_major_tracker_with_counties_corrected.xlsx')
-            elif os.path.exists('desri_public_opps_major_tracker_with_counties.xlsx'):
-                df = pd.read_excel('desri_public_opps_major_tracker_with_counties.xlsx')
-            else:
-                # Create sample data for demonstration
-                df = pd.DataFrame({
-                    'Project': ['Sample Project 1', 'Sample Project 2'],
-                    'State': ['CA', 'TX'],
-                    'County': ['Los Angeles County', 'Harris County'],
-                    'Sentiment': ['GOOD', 'MIXED'],
-                    'Latitude': [34.0522, 29.7604],
-                    'Longitude': [-118.2437, -95.3698]
-                })
-            
-            # Merge with user-added projects from Supabase
-            if supabase:
-                user_projects = get_user_added_projects(supabase)
-                if user_projects:
-                    # Convert Supabase data to DataFrame
-                    user_df = pd.DataFrame(user_projects)
-                    # Rename columns to match expected format
-                    column_mapping = {
-                        'project': 'Project',
-                        'state': 'State', 
-                        'county': 'County',
-                        'type': 'Type',
-                        'status': 'Status',
-                        'latitude': 'Latitude',
-                        'longitude': 'Longitude',
-                        'system_size_mw_ac': 'System Size (MW AC)',
-                        'system_size_mw_dc': 'System Size (MW DC)',
-                        'sentiment': 'Sentiment',
-                        'sentiment_detail': 'Sentiment Detail',
-                        'mentions_of_moratoria': 'Mentions of Moratoria',
-                        'recent_projects': 'Recent Projects'
-                    }
-                    user_df = user_df.rename(columns=column_mapping)
-                    # Add survey columns with proper names
-                    # Map survey question columns to their full text
-                    survey_questions = {
-                        'survey_q1': 'Can you describe any initial public opposition to the project - including when it occurred, its tone, scale, and level of organization, and the permitting stage it emerged in? Who were the most vocal opponents and supporters (if any)? If there was little or no opposition, please describe your community interactions, including any key supporters or positive dynamics that helped ease the permitting process.',
-                        'survey_q2': 'What were the most prominent concerns or recurring public fears raised by the community at this project? What type of approval(s) were being sought?',
-                        'survey_q3': 'Regarding this project, what forms of community engagement were used, and were they helpful? Do you believe engagement made - or could have made - a positive difference in the project\'s outcome? If so, which approaches were or would have been most effective?',
-                        'survey_q4': 'What were some of the most difficult or unexpected questions you\'ve been asked during public hearings, community meetings and/or public interactions regarding this project? How did you respond - or how do you wish you had responded?',
-                        'survey_q5': 'If the project succeeded with minimal or manageable opposition, what do you think made the difference?',
-                        'survey_q6': 'If opposition caused significant delay or failure, what factors do you believe contributed?',
-                        'survey_q7': 'Did public opposition affect project timeline and to what degree?',
-                        'survey_q8': '(OPTIONAL) Is there anything else you\'d like to share that didn\'t fit into the questions above?'
-                    }
-                    
-                    for i in range(1, 9):
-                        col_name = f'survey_q{i}'
-                        if col_name in user_df.columns:
-                            user_df[survey_questions[col_name]] = user_df[col_name]
-                    # Combine the dataframes
-                    df = pd.concat([df, user_df], ignore_index=True)
-            
-            # Also check for legacy CSV files (for backward compatibility)
-            elif os.path.exists('user_added_projects.csv'):
-                user_df = pd.read_csv('user_added_projects.csv')
-                df = pd.concat([df, user_df], ignore_index=True)
-            
-            # Remove projects that have been marked for removal
-            if supabase:
-                removed_projects_data = get_removed_projects(supabase)
-                if removed_projects_data:
-                    removed_projects = [p['project'] for p in removed_projects_data]
-                    df = df[~df['Project'].isin(removed_projects)]
-            # Also check for legacy CSV file
-            elif os.path.exists('removed_projects.csv'):
-                removed_df = pd.read_csv('removed_projects.csv')
-                removed_projects = removed_df['Project'].tolist()
-                df = df[~df['Project'].isin(removed_projects)]
-            
-            return df
-        except Exception as e:
-            st.error(f"Error loading data: {e}")
-            return pd.DataFrame()
-
-    # Load the data
-    df = load_data()
+    # Load the data (rebuilt only when the dataset version changes)
+    dataset_version = get_dataset_version(supabase)
+    df = load_data(dataset_version, supabase)
 
     if not df.empty:
         # Geographic View Section with AI Integration Notice
@@ -869,166 +830,117 @@ if page == "Opposition Tracker":
         col1, col2, col3 = st.columns(3)
         with col1:
             cluster_markers = st.checkbox("Cluster nearby markers", value=False)
+            show_county_sentiment = st.checkbox(
+                "Show county sentiment (SparkAI)",
+                value=False,
+                help="Shades every county with a SparkAI report by its community sentiment"
+            )
+            show_heatmap = st.checkbox(
+                "Show opposition heatmap",
+                value=False,
+                help="Hot spots of BAD/MIXED projects, 2025 contested projects and local restrictions"
+            )
         with col2:
             basemap_option = st.selectbox(
                 "Select Basemap",
                 ["Dark Gray", "Satellite", "Topographic", "Streets", "Oceans"]
             )
-    
-        if 'Latitude' in df.columns and 'Longitude' in df.columns:
-            import folium
-            from streamlit_folium import st_folium
-            from folium.plugins import Fullscreen, MiniMap, MarkerCluster
-            
-            # Prepare map data
-            df_map = df.dropna(subset=['Latitude', 'Longitude'])
-            
-            # Create base map centered on US
-            m = folium.Map(
-                    location=[39.8283, -98.5795],  # Center of US
-                    zoom_start=4,
-                    tiles=None,
-                    prefer_canvas=True,
-                    zoom_control=True,
-                    scrollWheelZoom=True,  # This enables scroll wheel zoom!
-                    dragging=True,
-                    doubleClickZoom=True,
-                    touchZoom=True,
-                    keyboard=True
+        with col3:
+            map_rendering = st.selectbox(
+                "Marker Rendering",
+                ["Individual markers", "Single GeoJSON layer", "Viewport only"],
+                help="A single GeoJSON layer keeps the map fast with thousands of projects; "
+                     "viewport only draws just the projects in view and updates as you pan and zoom"
             )
-            
-            # ArcGIS Basemap URLs
-            arcgis_basemaps = {
-                    "Dark Gray": {
-                        "url": "https://services.arcgisonline.com/ArcGIS/rest/services/Canvas/World_Dark_Gray_Base/MapServer/tile/{z}/{y}/{x}",
-                        "attr": "Esri, HERE, Garmin, © OpenStreetMap contributors, and the GIS User Community"
-                    },
-                    "Satellite": {
-                        "url": "https://services.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
-                        "attr": "Esri, DigitalGlobe, GeoEye, Earthstar Geographics, CNES/Airbus DS, USDA, USGS, AeroGRID, IGN"
-                    },
-                    "Topographic": {
-                        "url": "https://services.arcgisonline.com/ArcGIS/rest/services/World_Topo_Map/MapServer/tile/{z}/{y}/{x}",
-                        "attr": "Esri, HERE, Garmin, Intermap, increment P Corp., GEBCO, USGS, FAO, NPS, NRCAN, GeoBase, IGN"
-                    },
-                    "Streets": {
-                        "url": "https://services.arcgisonline.com/ArcGIS/rest/services/World_Street_Map/MapServer/tile/{z}/{y}/{x}",
-                        "attr": "Esri, HERE, Garmin, USGS, Intermap, INCREMENT P, NRCan, Esri Japan, METI, Esri China (Hong Kong)"
-                    },
-                    "Oceans": {
-                        "url": "https://services.arcgisonline.com/ArcGIS/rest/services/Ocean/World_Ocean_Base/MapServer/tile/{z}/{y}/{x}",
-                        "attr": "Esri, GEBCO, NOAA, National Geographic, Garmin, HERE, Geonames.org, and other contributors"
-                    }
-            }
-            
-            # Add selected basemap
-            basemap = arcgis_basemaps[basemap_option]
-            folium.TileLayer(
-                    tiles=basemap["url"],
-                    attr=basemap["attr"],
-                    name=basemap_option,
-                    overlay=False,
-                    control=True
-            ).add_to(m)
-            
-            # Add reference overlay for Dark Gray basemap
-            if basemap_option == "Dark Gray":
-                    folium.TileLayer(
-                        tiles="https://services.arcgisonline.com/ArcGIS/rest/services/Canvas/World_Dark_Gray_Reference/MapServer/tile/{z}/{y}/{x}",
-                        attr="Esri",
-                        name="Labels",
-                        overlay=True,
-                        control=True
-                    ).add_to(m)
-            
-            # Add controls
-            Fullscreen(position='topleft').add_to(m)
-            
-            # Sentiment colors
-            sentiment_colors = {
-                    'GOOD': '#2ecc71',
-                    'MIXED': '#f39c12',
-                    'BAD': '#e74c3c',
-                    'NO DATA': '#95a5a6'
-            }
-            
-            # Create marker cluster if enabled
-            if cluster_markers:
-                    marker_cluster = MarkerCluster(
-                        name='Projects',
-                        overlay=True,
-                        control=True,
-                        show=True
-                    ).add_to(m)
-            
-            # Add markers
-            for idx, row in df_map.iterrows():
-                    sentiment = row.get('Sentiment', 'NO DATA')
-            
-                    # Rich popup content
-                    popup_html = f"""
-                    <div style="font-family: Arial, sans-serif; width: 280px;">
-                        <h3 style="margin: 0 0 10px 0; color: #2c3e50;">{row.get('Project', 'Unknown')}</h3>
-                        <hr style="margin: 5px 0;">
-                        <table style="width: 100%; font-size: 14px;">
-                            <tr><td><b>Location:</b></td><td>{row.get('County', 'Unknown')}, {row.get('State', 'Unknown')}</td></tr>
-                            <tr><td><b>Type:</b></td><td>{row.get('Type', 'N/A')}</td></tr>
-                            <tr><td><b>Size:</b></td><td>{row.get('System Size (MW AC)', 'N/A')} MW</td></tr>
-                            <tr><td><b>Sentiment:</b></td><td><span style="color: {sentiment_colors.get(sentiment)}; font-weight: bold;">{sentiment}</span></td></tr>
-                            <tr><td><b>Status:</b></td><td>{row.get('Status', 'N/A')}</td></tr>
-                        </table>
-                        {f'<hr style="margin: 10px 0;"><p style="margin: 0; font-size: 12px;"><b>Notes:</b> {row.get("Opposition_Notes", "")}</p>' if pd.notna(row.get("Opposition_Notes")) and row.get("Opposition_Notes") else ''}
-                    </div>
-                    """
-            
-                    # Create circle marker
-                    marker = folium.CircleMarker(
-                        location=[row['Latitude'], row['Longitude']],
-                        radius=10,
-                        popup=folium.Popup(popup_html, max_width=300),
-                        tooltip=f"{row.get('Project', 'Unknown')} - {sentiment}",
-                        color='white',
-                        weight=2,
-                        fillColor=sentiment_colors.get(sentiment, '#95a5a6'),
-                        fillOpacity=0.8
+        
+        # Weight of each opposition source in the heatmap
+        heatmap_weights = dict(OPPOSITION_WEIGHTS)
+        if show_heatmap:
+            with st.expander("🔥 Heatmap Weights"):
+                weight_cols = st.columns(len(OPPOSITION_WEIGHTS))
+                for weight_col, (source, default_weight) in zip(weight_cols, OPPOSITION_WEIGHTS.items()):
+                    with weight_col:
+                        heatmap_weights[source] = st.slider(source, 0.0, 2.0, default_weight, 0.25)
+        
+        # County sentiment changes in each state's newest SparkAI report (precomputed per SparkAI data version)
+        if show_county_sentiment:
+            with st.expander("🕑 SparkAI Changes Since Last Report"):
+                sentiment_changes = get_latest_sentiment_changes(get_spark_data_version())
+                if sentiment_changes.empty:
+                    st.info("No county sentiment changed in the latest SparkAI reports.")
+                else:
+                    st.markdown(f"**{len(sentiment_changes)} county sentiment change(s)**")
+                    st.dataframe(count_transitions(sentiment_changes), hide_index=True, use_container_width=True)
+                    st.dataframe(
+                        sentiment_changes[['State', 'County', 'Previous Sentiment', 'Sentiment', 'Previous Date', 'Report Date']],
+                        hide_index=True,
+                        use_container_width=True,
+                        column_config={
+                            'Previous Date': st.column_config.DateColumn('Previous Report'),
+                            'Report Date': st.column_config.DateColumn('Latest Report')
+                        }
                     )
-            
-                    # Add to cluster or directly to map
-                    if cluster_markers:
-                        marker.add_to(marker_cluster)
-                    else:
-                        marker.add_to(m)
-            
-            # Add legend
-            legend_html = f'''
-            <div style="position: fixed; 
-                            bottom: 50px; left: 50px; width: 180px; 
-                            background-color: rgba(255, 255, 255, 0.95);
-                            border: 2px solid black;
-                            z-index: 1000; font-size: 14px;
-                            border-radius: 5px; padding: 15px;">
-                    <p style="margin: 0 0 10px 0; font-weight: bold; color: black;">Sentiment Legend</p>
-                    <p style="margin: 5px 0; color: black;"><span style="color: {sentiment_colors['GOOD']};">●</span> Good ({len(df_map[df_map['Sentiment'] == 'GOOD']) if 'Sentiment' in df_map.columns else 0})</p>
-                    <p style="margin: 5px 0; color: black;"><span style="color: {sentiment_colors['MIXED']};">●</span> Mixed ({len(df_map[df_map['Sentiment'] == 'MIXED']) if 'Sentiment' in df_map.columns else 0})</p>
-                    <p style="margin: 5px 0; color: black;"><span style="color: {sentiment_colors['BAD']};">●</span> Bad ({len(df_map[df_map['Sentiment'] == 'BAD']) if 'Sentiment' in df_map.columns else 0})</p>
-                    <p style="margin: 5px 0; color: black;"><span style="color: {sentiment_colors['NO DATA']};">●</span> No Data ({len(df_map[df_map['Sentiment'] == 'NO DATA']) if 'Sentiment' in df_map.columns else 0})</p>
-            </div>
-            '''
-            m.get_root().html.add_child(folium.Element(legend_html))
-            
-            # Add layer control
-            folium.LayerControl(position='topright').add_to(m)
+    
+        if 'Latitude' in df.columns and 'Longitude' in df.columns:
+            # Opposition heatmap from the grid aggregated once per dataset and report version,
+            # drawn as a layer over the map so that a weight change leaves the map cached
+            heatmap_layer = None
+            if show_heatmap:
+                report_version = get_report_version()
+                contested_points, restriction_points = None, None
+                if report_files_available():
+                    restrictions_df, contested_df = load_opposition_data()
+                    if contested_df is not None and 'County ID' in contested_df.columns:
+                        contested_points = get_contested_index(report_version, contested_df)[0]
+                    if restrictions_df is not None and {'State', 'County'} <= set(restrictions_df.columns):
+                        restriction_points = get_restriction_points(report_version, restrictions_df)
+                opposition_grid = get_opposition_grid(dataset_version, report_version, df, contested_points, restriction_points)
+                heatmap_layer = get_heatmap_layer(dataset_version, report_version, tuple(heatmap_weights.items()), opposition_grid)
+            
+            # Map for this dataset version and these options (built and rendered once, then served from cache)
+            m = get_tracker_map(dataset_version, basemap_option, cluster_markers, map_rendering, df, show_heatmap)
+            
+            # Clustering runs on the server: only the clusters for the current zoom level and viewport are sent
+            map_returned_objects = ["last_active_drawing"]
+            cluster_group = None
+            if map_rendering == "Viewport only":
+                cluster_group, projects_in_view, summarized = get_viewport_layer(
+                    dataset_version, get_map_zoom("map"), get_map_bounds("map"), df
+                )
+                map_returned_objects += ["zoom", "bounds"]
+            elif cluster_markers:
+                cluster_group = get_cluster_layer(dataset_version, get_map_zoom("map"), get_map_bounds("map"), df)
+                map_returned_objects += ["zoom", "bounds"]
+            
+            # County choropleth, simplified for the zoom tier and drawn below the markers
+            map_layers = [layer for layer in [heatmap_layer, cluster_group] if layer is not None]
+            if show_county_sentiment:
+                county_layer = get_county_layer(get_spark_data_version(), get_map_zoom("map"), get_map_bounds("map"))
+                map_layers.insert(0, county_layer)
+                map_returned_objects += [obj for obj in ["zoom", "bounds"] if obj not in map_returned_objects]
             
             # Display the map and capture clicked marker
-            map_data = st_folium(
+            map_data = show_tracker_map(
                 m, 
+                layers=map_layers,
                 height=600,  # Reduced height slightly to minimize viewport usage
                 width=None, 
-                returned_objects=["last_object_clicked", "last_object_clicked_tooltip"], 
+                returned_objects=map_returned_objects, 
                 key="map",
                 use_container_width=True
             )
             
+            if map_rendering == "Viewport only":
+                if summarized:
+                    st.caption(f"{projects_in_view} projects in view, shown as clusters. Zoom in to see individual projects.")
+                else:
+                    st.caption(f"Showing the {projects_in_view} projects in view")
+            
+            # Details of the clicked project, rendered on demand
+            clicked_position = get_project_lookup(dataset_version, df).get(get_clicked_project_id(map_data))
+            if clicked_position is not None:
+                st.markdown(df['Map_Popup'].iloc[clicked_position], unsafe_allow_html=True)
+            
         else:
             st.info("Geographic data not available")
     
@@ -1072,25 +984,23 @@ if page == "Opposition Tracker":
         # Project Database Section (moved from tab3)
         st.markdown("### Comprehensive Project Intelligence Database", unsafe_allow_html=True)
         
-        # Check if a project was clicked on the map
+        # Check if a project was clicked on the map (row position of the clicked project)
+        clicked_position = None
         clicked_project_name = None
         if 'map_data' in locals() and map_data:
-            # Check for tooltip data in the correct location
-            if 'last_object_clicked_tooltip' in map_data and map_data['last_object_clicked_tooltip']:
-                tooltip_text = map_data['last_object_clicked_tooltip']
-                if ' - ' in tooltip_text:
-                    clicked_project_name = tooltip_text.split(' - ')[0].strip()
-                    # Remove debug output once it's working
-                    # st.write("Debug - Extracted project name:", clicked_project_name)
+            clicked_position = get_project_lookup(dataset_version, df).get(get_clicked_project_id(map_data))
+            if clicked_position is not None:
+                clicked_project_name = df['Project'].iloc[clicked_position]
     
         # Add search bar for project name with autocomplete
         # Get all unique project names for the dropdown
-        all_project_names = [""] + sorted(df['Project'].dropna().unique().tolist()) if 'Project' in df.columns else [""]
+        project_names = get_project_names(dataset_version, df) if 'Project' in df.columns else pd.Index([])
+        all_project_names = [""] + project_names.tolist()
         
         # Pre-select clicked project if available
         default_index = 0
-        if clicked_project_name and clicked_project_name in all_project_names:
-            default_index = all_project_names.index(clicked_project_name)
+        if clicked_project_name in project_names:
+            default_index = project_names.get_loc(clicked_project_name) + 1
         
         # Use selectbox with search functionality
         project_search = st.selectbox(
@@ -1127,55 +1037,32 @@ if page == "Opposition Tracker":
             if st.button("Clear All Filters"):
                 st.rerun()
     
-        # Apply filters
-        filtered_df = df.copy()
-        
-        # Get list of projects with surveys for filtering
-        projects_with_surveys_filter = set()
-        
-        if supabase:
-            user_projects = get_user_added_projects(supabase)
-            for proj in user_projects:
-                has_survey = any([
-                    proj.get('survey_q1'),
-                    proj.get('survey_q2'),
-                    proj.get('survey_q3'),
-                    proj.get('survey_q4'),
-                    proj.get('survey_q5'),
-                    proj.get('survey_q6'),
-                    proj.get('survey_q7'),
-                    proj.get('survey_q8')
-                ])
-                if has_survey:
-                    projects_with_surveys_filter.add(proj['project'])
-        
-        # Also check main dataframe for survey columns
-        survey_cols = [col for col in df.columns if 'survey' in col.lower() or 'question' in col.lower()]
-        if survey_cols:
-            for _, row in df.iterrows():
-                if any(pd.notna(row.get(col)) for col in survey_cols):
-                    projects_with_surveys_filter.add(row['Project'])
+        # Apply filters as a boolean mask over the shared project table (never copy it)
+        filter_mask = pd.Series(True, index=df.index)
         
         # Apply project name search filter
         if project_search:
-            filtered_df = filtered_df[filtered_df['Project'].str.contains(project_search, case=False, na=False)]
+            filter_mask &= df['Project'].str.contains(project_search, case=False, na=False, regex=False)
         
         if 'state_filter' in locals() and state_filter != "All States":
-            filtered_df = filtered_df[filtered_df['State'].astype(str) == state_filter]
+            filter_mask &= df['State'] == state_filter
         if 'sentiment_filter' in locals() and sentiment_filter != "All Sentiments":
-            filtered_df = filtered_df[filtered_df['Sentiment'].astype(str) == sentiment_filter]
+            filter_mask &= df['Sentiment'] == sentiment_filter
         if 'type_filter' in locals() and type_filter != "All Types":
-            filtered_df = filtered_df[filtered_df['Type'].astype(str) == type_filter]
+            filter_mask &= df['Type'] == type_filter
         
         # Apply survey filter
         if 'survey_filter' in locals():
             if survey_filter == "Assessed ✅":
-                filtered_df = filtered_df[filtered_df['Project'].isin(projects_with_surveys_filter)]
+                filter_mask &= df['has_survey']
             elif survey_filter == "Pending Assessment ❌":
-                filtered_df = filtered_df[~filtered_df['Project'].isin(projects_with_surveys_filter)]
+                filter_mask &= ~df['has_survey']
+        
+        # Row labels of the matching projects
+        filtered_index = df.index[filter_mask.to_numpy()]
     
         # Display filtered data
-        st.markdown(f"Found {len(filtered_df)} projects", unsafe_allow_html=True)
+        st.markdown(f"Found {len(filtered_index)} projects", unsafe_allow_html=True)
         
         # Check if user has searched, filtered, or clicked a marker
         has_search_or_filter = (
@@ -1195,51 +1082,35 @@ if page == "Opposition Tracker":
                 st.success(f"📍 Selected from map: {clicked_project_name}")
             
             # Show data in an expandable format
-            st.markdown(f"Showing {min(len(filtered_df), 20)} of {len(filtered_df)} projects")
+            st.markdown(f"Showing {min(len(filtered_index), 20)} of {len(filtered_index)} projects")
             
             # If there's a clicked project, show it first
             displayed_projects = []
-            if clicked_project_name:
-                # Find the clicked project and add it first
-                clicked_rows = filtered_df[filtered_df['Project'] == clicked_project_name]
-                if not clicked_rows.empty:
-                    displayed_projects.append(clicked_rows.iloc[0])
+            if clicked_position is not None:
+                # Add the clicked project first
+                clicked_label = df.index[clicked_position]
+                if filter_mask.iloc[clicked_position]:
+                    displayed_projects.append(df.iloc[clicked_position])
                 
                 # Add other projects (excluding the clicked one to avoid duplication)
-                other_projects = filtered_df[filtered_df['Project'] != clicked_project_name].head(19)
-                for idx, row in other_projects.iterrows():
+                other_index = filtered_index[filtered_index != clicked_label][:19]
+                for idx, row in df.loc[other_index].iterrows():
                     displayed_projects.append(row)
             else:
                 # No clicked project, just show top 20
-                for idx, row in filtered_df.head(20).iterrows():
+                for idx, row in df.loc[filtered_index[:20]].iterrows():
                     displayed_projects.append(row)
             
-            # First, get list of projects that have survey data
-            projects_with_surveys = set()
-            
-            if supabase:
-                user_projects = get_user_added_projects(supabase)
-                for proj in user_projects:
-                    # Check if project has any survey responses
-                    has_survey = any([
-                        proj.get('survey_q1'),
-                        proj.get('survey_q2'),
-                        proj.get('survey_q3'),
-                        proj.get('survey_q4'),
-                        proj.get('survey_q5'),
-                        proj.get('survey_q6'),
-                        proj.get('survey_q7'),
-                        proj.get('survey_q8')
-                    ])
-                    if has_survey:
-                        projects_with_surveys.add(proj['project'])
+            # Survey answers for the project cards
+            survey_store = load_survey_store(dataset_version, supabase)
             
-            # Also check main dataframe for survey columns
-            survey_cols = [col for col in df.columns if 'survey' in col.lower() or 'question' in col.lower()]
-            if survey_cols:
-                for _, check_row in df.iterrows():
-                    if any(pd.notna(check_row.get(col)) for col in survey_cols):
-                        projects_with_surveys.add(check_row['Project'])
+            # Spatial indexes for the proximity panels (contested projects sit at their county centroid)
+            project_index = get_project_index(dataset_version, df)
+            contested_located, contested_index = None, None
+            if report_files_available():
+                _, contested_df = load_opposition_data()
+                if contested_df is not None and 'County ID' in contested_df.columns:
+                    contested_located, contested_index = get_contested_index(get_report_version(), contested_df)
             
             # Display the projects
             for idx, row in enumerate(displayed_projects):
@@ -1247,7 +1118,7 @@ if page == "Opposition Tracker":
                 state = row.get('State', 'Unknown State')
                 
                 # Check if this project has survey data
-                has_survey = project_name in projects_with_surveys
+                has_survey = bool(row.get('has_survey', False))
                 survey_badge = "✅ Has Survey" if has_survey else "📝 Needs Survey"
                 survey_color = "#2ecc71" if has_survey else "#e74c3c"
                 
@@ -1347,6 +1218,31 @@ if page == "Opposition Tracker":
                     </div>
                     """, unsafe_allow_html=True)
                 
+                # Proximity to other tracked projects and to contested projects
+                project_lat = pd.to_numeric(row.get('Latitude'), errors='coerce')
+                project_lon = pd.to_numeric(row.get('Longitude'), errors='coerce')
+                if pd.notna(project_lat) and pd.notna(project_lon):
+                    with st.expander("📏 Nearby Projects"):
+                        nearby_positions, _ = project_index.within_radius(project_lat, project_lon, NEARBY_RADIUS_MILES)
+                        nearby_count = int((nearby_positions != row.name).sum())
+                        st.markdown(f"**{nearby_count}** other tracked projects within {NEARBY_RADIUS_MILES} miles")
+                        
+                        nearest_positions, nearest_distances = project_index.nearest(project_lat, project_lon, k=5, exclude=[row.name])
+                        if len(nearest_positions):
+                            nearest_projects = df.iloc[nearest_positions][['Project', 'State', 'Sentiment']].copy()
+                            nearest_projects['Distance (mi)'] = nearest_distances.round(1)
+                            st.dataframe(nearest_projects, hide_index=True)
+                        
+                        if contested_index is not None:
+                            contested_positions, contested_distances = contested_index.nearest(project_lat, project_lon, k=1)
+                            if len(contested_positions):
+                                contested = contested_located.iloc[contested_positions[0]]
+                                st.markdown(
+                                    f"⚠️ Nearest contested project: **{contested.get('Title', 'Unknown')}** "
+                                    f"({contested.get('Status', 'N/A')}, {contested.get('County', 'N/A')}, {contested.get('State', 'N/A')}) "
+                                    f"~{contested_distances[0]:.0f} miles away (county centroid)"
+                                )
+                
                 # Sentiment Details
                 if 'Sentiment Detail' in row and pd.notna(row['Sentiment Detail']):
                     sentiment_text = str(row['Sentiment Detail'])
@@ -1455,24 +1351,21 @@ if page == "Opposition Tracker":
                                     """, unsafe_allow_html=True)
                         st.markdown("</div>", unsafe_allow_html=True)
                     
-                # Survey Questions and Answers - properly mapped to actual column names
+                # Survey Questions and Answers - looked up in the survey store by survey key
                 survey_questions = [
-                        ("🎯 Initial Public Opposition", "Can you describe any initial public opposition to the project — including when it occurred, its tone, scale, and level of organization, and the permitting stage it emerged in? Who were the most vocal opponents and supporters (if any)? If there was little or no opposition, please describe your community interactions, including any key supporters or positive dynamics that helped ease the permitting process."),
-                        ("⚡ Prominent Concerns", "What were the most prominent concerns or recurring public fears raised by the community at this project? What type of approval(s) were being sought? ("),
-                        ("🤝 Community Engagement", "Regarding this project, what forms of community engagement were used, and were they helpful? Do you believe engagement made — or could have made — a positive difference in the project's outcome? If so, which approaches were or would have been most effective?"),
-                        ("❓ Difficult Questions", "What were some of the most difficult or unexpected questions you've been asked during public hearings, community meetings and/or public interactions regarding this project? How did you respond — or how do you wish you had responded?"),
-                        ("✅ Success Factors", "If the project succeeded with minimal or manageable opposition, what do you think made the difference?"),
-                        ("❌ Failure Factors", "If opposition caused significant delay or failure, what factors do you believe contributed?"),
-                        ("⏱️ Timeline Impact", "Did public opposition affect project timeline and to what degree?"),
-                        ("💭 Additional Comments", "(OPTIONAL) Is there anything else you'd like to share that didn't fit into the questions above?")
+                        ("🎯 Initial Public Opposition", "survey_q1", "Can you describe any initial public opposition to the project — including when it occurred, its tone, scale, and level of organization, and the permitting stage it emerged in? Who were the most vocal opponents and supporters (if any)? If there was little or no opposition, please describe your community interactions, including any key supporters or positive dynamics that helped ease the permitting process."),
+                        ("⚡ Prominent Concerns", "survey_q2", "What were the most prominent concerns or recurring public fears raised by the community at this project? What type of approval(s) were being sought? ("),
+                        ("🤝 Community Engagement", "survey_q3", "Regarding this project, what forms of community engagement were used, and were they helpful? Do you believe engagement made — or could have made — a positive difference in the project's outcome? If so, which approaches were or would have been most effective?"),
+                        ("❓ Difficult Questions", "survey_q4", "What were some of the most difficult or unexpected questions you've been asked during public hearings, community meetings and/or public interactions regarding this project? How did you respond — or how do you wish you had responded?"),
+                        ("✅ Success Factors", "survey_q5", "If the project succeeded with minimal or manageable opposition, what do you think made the difference?"),
+                        ("❌ Failure Factors", "survey_q6", "If opposition caused significant delay or failure, what factors do you believe contributed?"),
+                        ("⏱️ Timeline Impact", "survey_q7", "Did public opposition affect project timeline and to what degree?"),
+                        ("💭 Additional Comments", "survey_q8", "(OPTIONAL) Is there anything else you'd like to share that didn't fit into the questions above?")
                     ]
                     
                 # Check if any survey answers exist
-                has_survey_data = False
-                for _, col_name in survey_questions:
-                    if col_name in row and pd.notna(row[col_name]):
-                        has_survey_data = True
-                        break
+                project_survey = get_project_survey(survey_store, project_name)
+                has_survey_data = bool(project_survey)
                 
                 if has_survey_data:
                         st.markdown("""
@@ -1480,14 +1373,14 @@ if page == "Opposition Tracker":
                             <h3 style="color: #2c3e50; margin: 0 0 20px 0; font-size: 1.4rem;">📋 Community Engagement Survey Responses</h3>
                         """, unsafe_allow_html=True)
                         
-                        for title, col_name in survey_questions:
-                            if col_name in row and pd.notna(row[col_name]):
-                                answer_text = str(row[col_name])
+                        for title, survey_key, question_text in survey_questions:
+                            if survey_key in project_survey:
+                                answer_text = project_survey[survey_key]
                                 st.markdown(f"""
                                 <div style="background: white; padding: 20px; border-radius: 10px; margin-bottom: 15px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
                                     <h5 style="color: #3498db; margin: 0 0 10px 0; font-size: 1.1rem;">{title}</h5>
                                     <p style="color: #7f8c8d; font-style: italic; margin: 0 0 15px 0; font-size: 0.9rem; line-height: 1.4;">
-                                        {col_name}
+                                        {question_text}
                                     </p>
                                     <div style="background: #f1f8ff; padding: 15px; border-radius: 8px; border-left: 3px solid #3498db;">
                                         <p style="color: #2c3e50; margin: 0; line-height: 1.6;">
@@ -1544,7 +1437,7 @@ if page == "Opposition Tracker":
         """, unsafe_allow_html=True)
         
         # Create tabs for Add, Remove, and Restore
-        tab1, tab2, tab3, tab4 = st.tabs(["➕ Add New Project", "🗑️ Remove Project", "♻️ Restore Projects", "📝 Add/Edit Survey"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["➕ Add New Project", "🗑️ Remove Project", "♻️ Restore Projects", "📝 Add/Edit Survey", "🔄 Refresh SparkAI Data"])
         
         with tab1:
             st.markdown("### Add New Project")
@@ -1666,28 +1559,8 @@ if page == "Opposition Tracker":
                 
                 if submitted:
                     if new_project_name and new_state and new_county and new_latitude != 0 and new_longitude != 0:
-                        # Load sentiment data from SparkAI files
-                        sentiment_data = None
-                        spark_file_pattern = f"us_public_opposition_sparkai/spark_bulk_report_{new_state}_counties_*.csv"
-                        
-                        import glob
-                        spark_files = glob.glob(spark_file_pattern)
-                        
-                        if spark_files:
-                            try:
-                                spark_df = pd.read_csv(spark_files[0])
-                                # Look for matching county
-                                county_match = spark_df[spark_df['County'].str.contains(new_county.replace(' County', ''), case=False, na=False)]
-                                if not county_match.empty:
-                                    sentiment_row = county_match.iloc[0]
-                                    sentiment_data = {
-                                        'Sentiment': sentiment_row.get('Sentiment', sentiment_row.get('Overall_Sentiment', 'NO DATA')),
-                                        'Sentiment Detail': sentiment_row.get('Sentiment Detail', sentiment_row.get('Summary', '')),
-                                        'Mentions of Moratoria': sentiment_row.get('Mentions of Moratoria', sentiment_row.get('Moratoria_Mentions', 'No mentions of moratoria')),
-                                        'Recent Projects': sentiment_row.get('Recent Projects', sentiment_row.get('Recent_Projects', ''))
-                                    }
-                            except:
-                                pass
+                        # SparkAI sentiment of the project's county (cached, indexed county table)
+                        sentiment_data = lookup_spark_county(new_state, new_county)
                         
                         # Create new project entry for Supabase
                         new_project = {
@@ -1719,7 +1592,7 @@ if page == "Opposition Tracker":
                             success = add_user_project(supabase, new_project)
                             if success:
                                 st.success(f"✅ Project '{new_project_name}' added successfully to cloud database!")
-                                st.cache_data.clear()  # Clear cache to ensure fresh data
+                                refresh_project_data()  # Clear cache to ensure fresh data
                                 st.rerun()
                             else:
                                 st.error("Failed to add project to database. Please try again.")
@@ -1752,7 +1625,7 @@ if page == "Opposition Tracker":
                             
                             user_df.to_csv(user_projects_file, index=False)
                             st.success(f"✅ Project '{new_project_name}' added locally!")
-                            st.cache_data.clear()
+                            refresh_project_data()
                             st.rerun()
                     else:
                         st.error("Please fill in all required fields (*)")
@@ -1786,7 +1659,7 @@ if page == "Opposition Tracker":
                                 success, message = remove_project(supabase, project_to_remove)
                                 if success:
                                     st.success(f"✅ Project '{project_to_remove}' removed successfully! (Can be restored later)")
-                                    st.cache_data.clear()
+                                    refresh_project_data()
                                     st.rerun()
                                 else:
                                     st.warning(f"⚠️ {message}")
@@ -1813,7 +1686,7 @@ if page == "Opposition Tracker":
                                 
                                 if removed:
                                     st.success(f"✅ Project '{project_to_remove}' removed! (Can be restored later)")
-                                    st.cache_data.clear()
+                                    refresh_project_data()
                                     st.rerun()
             else:
                 st.info("No projects available to remove.")
@@ -1841,7 +1714,7 @@ if page == "Opposition Tracker":
                                 success = restore_project(supabase, project_to_restore)
                                 if success:
                                     st.success(f"✅ Project '{project_to_restore}' restored successfully!")
-                                    st.cache_data.clear()
+                                    refresh_project_data()
                                     st.rerun()
                                 else:
                                     st.error("Failed to restore project.")
@@ -1852,7 +1725,7 @@ if page == "Opposition Tracker":
                         success = restore_all_projects(supabase)
                         if success:
                             st.success(f"✅ All {len(removed_list)} projects restored successfully!")
-                            st.cache_data.clear()
+                            refresh_project_data()
                             st.rerun()
                         else:
                             st.error("Failed to restore all projects.")
@@ -1884,7 +1757,7 @@ if page == "Opposition Tracker":
                                         os.remove('removed_projects.csv')
                                     
                                     st.success(f"✅ Project '{project_to_restore}' restored locally!")
-                                    st.cache_data.clear()
+                                    refresh_project_data()
                                     st.rerun()
                         
                         # Option to restore all
@@ -1892,7 +1765,7 @@ if page == "Opposition Tracker":
                         if st.button("♻️ Restore All Projects", type="secondary"):
                             os.remove('removed_projects.csv')
                             st.success(f"✅ All {len(removed_list)} projects restored locally!")
-                            st.cache_data.clear()
+                            refresh_project_data()
                             st.rerun()
                     else:
                         st.info("No removed projects to restore.")
@@ -1907,36 +1780,9 @@ if page == "Opposition Tracker":
             projects_with_survey_status = []
             
             if not df.empty:
-                # Get list of projects that have survey data
-                projects_with_surveys = set()
-                
-                if supabase:
-                    user_projects = get_user_added_projects(supabase)
-                    for proj in user_projects:
-                        # Check if project has any survey responses
-                        has_survey = any([
-                            proj.get('survey_q1'),
-                            proj.get('survey_q2'),
-                            proj.get('survey_q3'),
-                            proj.get('survey_q4'),
-                            proj.get('survey_q5'),
-                            proj.get('survey_q6'),
-                            proj.get('survey_q7'),
-                            proj.get('survey_q8')
-                        ])
-                        if has_survey:
-                            projects_with_surveys.add(proj['project'])
-                
-                # Also check main dataframe for survey columns
-                survey_cols = [col for col in df.columns if 'survey' in col.lower() or 'question' in col.lower()]
-                if survey_cols:
-                    for _, row in df.iterrows():
-                        if any(pd.notna(row.get(col)) for col in survey_cols):
-                            projects_with_surveys.add(row['Project'])
-                
                 # Create list with survey indicators
-                for project in df['Project'].tolist():
-                    if project in projects_with_surveys:
+                for project, has_survey in zip(df['Project'].tolist(), df['has_survey'].tolist()):
+                    if has_survey:
                         projects_with_survey_status.append(f"✅ {project} (Has survey)")
                     else:
                         projects_with_survey_status.append(f"❌ {project} (No survey)")
@@ -2002,28 +1848,10 @@ if page == "Opposition Tracker":
                 
                 if selected_project:
                     # Get existing survey data if available
-                    existing_survey_data = {}
                     project_row = df[df['Project'] == selected_project].iloc[0] if len(df[df['Project'] == selected_project]) > 0 else None
                     
-                    # First check if project has survey data in the main DataFrame
-                    if project_row is not None:
-                        # Check for survey columns in the main dataset
-                        for i in range(1, 9):
-                            col_name = f'survey_q{i}'
-                            if col_name in df.columns and pd.notna(project_row.get(col_name)):
-                                existing_survey_data[col_name] = str(project_row.get(col_name))
-                    
-                    if supabase:
-                        # Check if this project has survey data in Supabase (this will override DataFrame data if exists)
-                        user_projects = get_user_added_projects(supabase)
-                        for proj in user_projects:
-                            if proj['project'] == selected_project:
-                                # Update with Supabase data (more recent)
-                                for i in range(1, 9):
-                                    key = f'survey_q{i}'
-                                    if proj.get(key):
-                                        existing_survey_data[key] = proj.get(key)
-                                break
+                    # Survey store answers (Supabase answers already override the workbook)
+                    existing_survey_data = get_project_survey(load_survey_store(dataset_version, supabase), selected_project)
                     
                     # Display message if existing survey data was found
                     if any(existing_survey_data.values()):
@@ -2140,7 +1968,7 @@ if page == "Opposition Tracker":
                                     
                                 if success:
                                     st.success(f"✅ Survey responses saved for '{selected_project}'!")
-                                    st.cache_data.clear()
+                                    refresh_project_data()
                                     st.rerun()
                                 else:
                                     st.error("Failed to save survey responses.")
@@ -2148,6 +1976,57 @@ if page == "Opposition Tracker":
                                 st.warning("⚠️ Supabase not configured. Survey functionality requires cloud database.")
             else:
                 st.info("No projects available. Add a project first.")
+        
+        with tab5:
+            st.markdown("### Refresh SparkAI Data")
+            st.info("🤖 Re-apply the latest SparkAI county reports to every user-added project. Projects in counties without a report keep their current data.")
+            
+            if supabase:
+                if st.button("🔍 Check for Changes"):
+                    try:
+                        st.session_state.spark_reenrichment_plan, _ = reenrich_projects(supabase, apply=False)
+                    except Exception as e:
+                        st.error(f"Error checking SparkAI data: {e}")
+                
+                reenrichment_plan = st.session_state.get('spark_reenrichment_plan')
+                if reenrichment_plan is not None:
+                    if reenrichment_plan.empty:
+                        st.success("✅ All projects are up to date with the latest SparkAI reports.")
+                    else:
+                        st.markdown(f"**{len(reenrichment_plan)} project(s) with changed SparkAI data**")
+                        st.dataframe(sentiment_transitions(reenrichment_plan), hide_index=True, use_container_width=True)
+                        st.dataframe(
+                            reenrichment_plan[['project', 'state', 'county', 'Old Sentiment', 'sentiment', 'Changed Fields']].rename(columns={
+                                'project': 'Project', 'state': 'State', 'county': 'County', 'sentiment': 'New Sentiment'
+                            }),
+                            hide_index=True,
+                            use_container_width=True
+                        )
+                        
+                        if st.button(f"🔄 Update {len(reenrichment_plan)} Project(s)", type="primary"):
+                            written = upsert_user_projects(supabase, plan_rows(reenrichment_plan))
+                            del st.session_state.spark_reenrichment_plan
+                            if written == len(reenrichment_plan):
+                                st.success(f"✅ SparkAI data refreshed for {written} project(s)!")
+                                refresh_project_data()
+                                st.rerun()
+                            else:
+                                st.error(f"Only {written} of {len(reenrichment_plan)} projects were updated. Please try again.")
+                                refresh_project_data()
+            else:
+                st.warning("⚠️ Supabase not configured. Refreshing SparkAI data requires cloud database.")
+            
+            # Problems found while ingesting the SparkAI report files
+            report_issues = get_spark_report_issues()
+            if not report_issues.empty:
+                with st.expander(f"⚠️ SparkAI Report Problems ({len(report_issues)})"):
+                    st.dataframe(report_issues, hide_index=True, use_container_width=True)
+        
+        # Memory footprint of the shared project table
+        with st.expander("🧮 Dataset Memory Usage"):
+            memory_df = get_memory_report(dataset_version, df)
+            st.markdown(f"**Total:** {memory_df['Memory (KB)'].sum():,.1f} KB across {len(df)} projects")
+            st.dataframe(memory_df, hide_index=True, use_container_width=True)
 
     else:
         st.error("No data available. Please ensure the data file is in the correct location.")
@@ -2156,19 +2035,7 @@ elif page == "2025 Opposition Report":
     st.markdown("# 2025 Opposition Report (as of June 2025)")
     st.markdown("---")
     
-    # Load the data
-    @st.cache_data
-    def load_opposition_data():
-        try:
-            # Load restrictions data
-            restrictions_df = pd.read_csv('2025-Restrictions.csv', encoding='utf-8-sig')
-            # Load contested projects data  
-            contested_df = pd.read_csv('2025-Contested-Projects.csv', encoding='utf-8-sig')
-            return restrictions_df, contested_df
-        except Exception as e:
-            st.error(f"Error loading data: {e}")
-            return None, None
-    
+    # Load the data (shared, read-only copy held once per process)
     restrictions_df, contested_df = load_opposition_data()
     
     if restrictions_df is not None and contested_df is not None:
@@ -2177,7 +2044,6 @@ elif page == "2025 Opposition Report":
         state_restrictions = restrictions_df.groupby('State').size().reset_index(name='restriction_count')
         
         # Count contested projects by state and type
-        contested_df['State_List'] = contested_df['State'].str.split('|')
         # Expand states for projects that span multiple states
         state_projects = []
         for idx, row in contested_df.iterrows():
@@ -2473,8 +2339,11 @@ elif page == "2025 Opposition Report":
                 # If a state is selected, show county filter
                 if browse_state != "All States":
                     # Get all counties for selected state
-                    state_counties_restrict = restrictions_df[restrictions_df['State'] == browse_state]['County'].unique()
-                    state_counties_contest = contested_df[contested_df['State'].str.contains(browse_state, na=False)]['County'].unique()
+                    # Report rows can list several counties separated by '|'
+                    state_counties_restrict = restrictions_df[restrictions_df['State'] == browse_state]['County'] \
+                        .str.split('|').explode().str.strip().unique()
+                    state_counties_contest = contested_df[contested_df['State'].str.contains(browse_state, na=False)]['County'] \
+                        .str.split('|').explode().str.strip().unique()
                     all_state_counties = list(set(list(state_counties_restrict) + list(state_counties_contest)))
                     all_state_counties = [c for c in all_state_counties if pd.notna(c)]
                     all_state_counties.sort()
@@ -2595,10 +2464,15 @@ elif page == "2025 Opposition Report":
                 state_contested = contested_df[contested_df['State'].str.contains(selected_state, na=False)]
                 state_restrict = restrictions_df[restrictions_df['State'] == selected_state]
                 
-                # Filter by county if specific county selected
+                # Filter by county if specific county selected (matched on County ID / normalized county key)
                 if selected_county != "All Counties":
-                    state_contested = state_contested[state_contested['County'] == selected_county]
-                    state_restrict = state_restrict[state_restrict['County'] == selected_county]
+                    selected_key = county_key(selected_state, selected_county)
+                    contested_keys = county_list_keys(selected_state, state_contested['County'])
+                    if 'County ID' in state_contested.columns:
+                        contested_fips = county_fips(state_contested['County ID'])
+                        contested_keys = [{fips} if pd.notna(fips) else keys for fips, keys in zip(contested_fips, contested_keys)]
+                    state_contested = state_contested[[selected_key in keys for keys in contested_keys]]
+                    state_restrict = state_restrict[[selected_key in keys for keys in county_list_keys(selected_state, state_restrict['County'])]]
                     
                     # Show county summary metrics
                     col1, col2, col3 = st.columns(3)
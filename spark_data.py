@@ -0,0 +1,376 @@
+"""
+SparkAI county sentiment data for the DESRI Opposition Tracker
+"""
+import csv
+import glob
+import hashlib
+import io
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import streamlit as st
+from county_matching import county_key, county_keys, resolve_counties
+
+# Directory of SparkAI bulk county reports (spark_bulk_report_{STATE}_counties_{DATE}.csv)
+SPARK_DATA_DIR = 'us_public_opposition_sparkai'
+SPARK_FILE_PATTERN = 'spark_bulk_report_*_counties_*.csv'
+SPARK_FILE_NAME = re.compile(r'spark_bulk_report_(?P<state>[A-Za-z]{2})_counties_(?P<date>\d{4}-\d{2}-\d{2})\.csv$')
+
+# Column names used by older reports -> current names
+SPARK_COLUMN_ALIASES = {
+    'Overall_Sentiment': 'Sentiment',
+    'Summary': 'Sentiment Detail',
+    'Moratoria_Mentions': 'Mentions of Moratoria',
+    'Recent_Projects': 'Recent Projects'
+}
+
+# Columns of the consolidated county table
+SPARK_TEXT_COLUMNS = ['County', 'Municipality', 'Permitted Uses', 'Mentions of Moratoria',
+                      'Sentiment Detail', 'Recent Projects', 'Detailed Report']
+SPARK_SENTIMENTS = ['GOOD', 'MIXED', 'BAD', 'NO DATA']
+
+# Columns every SparkAI bulk report is expected to have (current names)
+SPARK_REPORT_COLUMNS = ['Detailed Report', 'County', 'State', 'Municipality', 'Permitted Uses',
+                        'Mentions of Moratoria', 'Sentiment', 'Sentiment Detail', 'Recent Projects']
+
+# Consolidated store of every parsed report, kept next to the tracker workbook snapshots;
+# bump SPARK_STORE_FORMAT whenever the stored columns or row checks change
+SPARK_STORE_DIR = '.snapshots'
+SPARK_STORE_FORMAT = 3
+SPARK_STORE_COLUMNS = ['Source File', 'State', 'Report Date', 'County ID', 'County Key', 'Sentiment', *SPARK_TEXT_COLUMNS]
+
+# Reports parsed at the same time when new files arrive
+SPARK_INGEST_WORKERS = 8
+
+# SparkAI fields copied onto a new project, with the value used when a report has none
+ENRICHMENT_FIELDS = {
+    'Sentiment': 'NO DATA',
+    'Sentiment Detail': '',
+    'Mentions of Moratoria': 'No mentions of moratoria',
+    'Recent Projects': ''
+}
+
+logger = logging.getLogger(__name__)
+
+
+def get_spark_files():
+    """Sorted list of SparkAI bulk report files"""
+    return sorted(glob.glob(os.path.join(SPARK_DATA_DIR, SPARK_FILE_PATTERN)))
+
+
+def get_spark_snapshots():
+    """Every dated SparkAI report as (state, report date, path), ordered by state, date and path"""
+    snapshots = []
+    for path in get_spark_files():
+        match = SPARK_FILE_NAME.search(os.path.basename(path))
+        if match:
+            snapshots.append((match['state'].upper(), match['date'], path))
+    return sorted(snapshots)
+
+
+def get_latest_spark_files():
+    """Newest report of each state as (state, report date, path), ordered by state (same date: last path wins)"""
+    latest = {}
+    for state, report_date, path in get_spark_snapshots():
+        latest[state] = (report_date, path)
+    return [(state, report_date, path) for state, (report_date, path) in latest.items()]
+
+
+def get_spark_data_version():
+    """Cheap change marker for the SparkAI directory: (name, mtime, size) of every report"""
+    version = []
+    for path in get_spark_files():
+        stat = os.stat(path)
+        version.append((os.path.basename(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(version)
+
+
+def spark_sentiments(values):
+    """Sentiment labels as a categorical of SPARK_SENTIMENTS (anything else becomes NO DATA)"""
+    sentiment = pd.Series(values, dtype='string').str.strip().str.upper()
+    return pd.Categorical(sentiment.where(sentiment.isin(SPARK_SENTIMENTS), 'NO DATA'), categories=SPARK_SENTIMENTS)
+
+
+def _report_issue(path, line, problem):
+    return {'File': os.path.basename(path), 'Line': line, 'Problem': problem}
+
+
+def _well_formed_lines(path, lines, issues):
+    """
+    Header and data lines of a report whose records have as many fields as the header.
+
+    Returns (kept lines, line number each kept record starts on). Other records
+    (too many fields, or too few - a short row would otherwise be read with
+    its trailing fields empty) are reported in `issues` with their line and
+    left out. Blank lines are dropped.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, [])
+    kept, starts = lines[:reader.line_num], []
+    start = reader.line_num
+    for fields in reader:
+        if fields and len(fields) != len(header):
+            issues.append(_report_issue(path, start + 1, f"Malformed row skipped ({len(fields)} fields, "
+                                                         f"header has {len(header)}): {','.join(fields)[:80]}"))
+        elif fields:
+            kept += lines[start:reader.line_num]
+            starts.append(start + 1)
+        start = reader.line_num
+    return kept, starts
+
+
+def parse_spark_report(state, report_date, path):
+    """
+    Read one SparkAI report and check it against SPARK_REPORT_COLUMNS.
+
+    Returns (rows, issues): the report's rows with the expected columns plus
+    Source File, File State, Line (file line the row starts on) and Report
+    Date - None when the file cannot be read - and the file-level problems
+    found (see validate_report_rows). Rows whose field count differs from the
+    header are skipped (see _well_formed_lines); missing columns stay empty.
+    """
+    issues = []
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            lines, starts = _well_formed_lines(path, list(f), issues)
+        frame = pd.read_csv(io.StringIO(''.join(lines)), dtype=str)
+    except Exception as e:
+        return None, [_report_issue(path, None, f"Unreadable file: {e}")]
+
+    frame = frame.rename(columns=SPARK_COLUMN_ALIASES)
+    missing = [column for column in SPARK_REPORT_COLUMNS if column not in frame.columns]
+    unexpected = [str(column) for column in frame.columns if column not in SPARK_REPORT_COLUMNS]
+    if missing:
+        issues.append(_report_issue(path, None, f"Missing columns: {', '.join(missing)}"))
+    if unexpected:
+        issues.append(_report_issue(path, None, f"Unexpected columns ignored: {', '.join(unexpected)}"))
+    rows = frame.reindex(columns=SPARK_REPORT_COLUMNS)
+    return rows.assign(**{
+        'Source File': os.path.basename(path),
+        'File State': state,
+        'Line': starts,
+        'Report Date': pd.Timestamp(report_date)
+    }), issues
+
+
+def validate_report_rows(rows):
+    """
+    Row checks of parsed reports (see parse_spark_report), run over all new reports at once.
+
+    Returns (valid rows, issues) with issues as dicts of File, Line and
+    Problem: rows without a County are skipped, unknown sentiments are read
+    as NO DATA and every row keeps the state of its file name, so a State
+    column naming another state is reported but never moves the county into
+    that state's data.
+    """
+    rows = rows.reset_index(drop=True)
+    states = rows['State'].str.strip().str.upper()
+    sentiment = rows['Sentiment'].str.strip().str.upper()
+    no_county = rows['County'].fillna('').str.strip().eq('')
+    checks = [
+        (no_county, lambda row: "Missing County - row skipped"),
+        (sentiment.notna() & ~sentiment.isin(SPARK_SENTIMENTS) & ~no_county,
+         lambda row: f"Unknown sentiment '{row['Sentiment']}' read as NO DATA"),
+        (states.notna() & states.ne(rows['File State']) & ~no_county,
+         lambda row: f"State '{row['State']}' differs from the file's state - read as {row['File State']}")
+    ]
+    issues = []
+    for failed, problem in checks:
+        for _, row in rows[failed.to_numpy()].iterrows():
+            issues.append({'File': row['Source File'], 'Line': int(row['Line']), 'Problem': problem(row)})
+    valid = rows[~no_county.to_numpy()]
+    return valid.assign(State=valid['File State']), issues
+
+
+def prepare_store_rows(rows):
+    """Valid report rows in the store layout: County ID, County Key and normalized Sentiment"""
+    rows = rows.reset_index(drop=True)
+    rows['County ID'] = resolve_counties(rows['State'], rows['County']).to_numpy()
+    rows['County Key'] = county_keys(rows['State'], rows['County']).to_numpy()
+    rows['Sentiment'] = spark_sentiments(rows['Sentiment'])
+    return rows[SPARK_STORE_COLUMNS]
+
+
+def _store_dtypes(store):
+    """Store columns in their compact types (concatenation turns categoricals of different files into text)"""
+    store = store.reindex(columns=SPARK_STORE_COLUMNS)
+    store = store.astype({'County ID': 'string', 'County Key': 'string', **{column: 'string' for column in SPARK_TEXT_COLUMNS}})
+    store[['Source File', 'State']] = store[['Source File', 'State']].astype('category')
+    store['Report Date'] = pd.to_datetime(store['Report Date'])
+    store['Sentiment'] = pd.Categorical(store['Sentiment'], categories=SPARK_SENTIMENTS)
+    return store
+
+
+def get_spark_store_path(spark_version):
+    """Parquet path of the consolidated store for a SparkAI data version"""
+    digest = hashlib.sha256(repr((SPARK_STORE_FORMAT, spark_version)).encode()).hexdigest()
+    return os.path.join(SPARK_STORE_DIR, f"spark_reports.{digest[:16]}.parquet")
+
+
+def _read_previous_store():
+    """Most recently written consolidated store of any data version, or None"""
+    try:
+        paths = glob.glob(os.path.join(SPARK_STORE_DIR, 'spark_reports.*.parquet'))
+        if paths:
+            store = pd.read_parquet(max(paths, key=os.path.getmtime))
+            if store.attrs.get('format') == SPARK_STORE_FORMAT:
+                return store
+    except Exception:
+        pass
+    return None
+
+
+def write_spark_store(store, store_path):
+    """Atomically write the consolidated store and drop the stores of older data versions"""
+    os.makedirs(SPARK_STORE_DIR, exist_ok=True)
+    tmp_path = f"{store_path}.tmp"
+    store.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, store_path)
+    for old_path in glob.glob(os.path.join(SPARK_STORE_DIR, 'spark_reports.*.parquet')):
+        if old_path != store_path:
+            os.remove(old_path)
+
+
+def ingest_spark_reports(spark_version):
+    """
+    Build the consolidated store of every dated SparkAI report.
+
+    Reports already in the previous store with the same name, mtime and size
+    are reused as they are; only new or changed files are parsed and
+    validated, in parallel. attrs['issues'] holds the problems found per file
+    (see parse_spark_report). The store is written as one Parquet file.
+    """
+    versions = {name: f"{mtime_ns}:{size}" for name, mtime_ns, size in spark_version}
+    snapshots = get_spark_snapshots()
+    parsed = {}  # file name -> (rows, issues)
+
+    previous = _read_previous_store()
+    if previous is not None:
+        previous_versions = previous.attrs.get('versions', {})
+        previous_issues = previous.attrs.get('issues', {})
+        previous_rows = dict(tuple(previous.groupby('Source File', observed=True, sort=False)))
+        for name, version in versions.items():
+            if previous_versions.get(name) == version:
+                parsed[name] = (previous_rows.get(name), previous_issues.get(name, []))
+
+    # Files are read and validated in parallel; county matching then runs once over all new rows
+    new_snapshots = [snapshot for snapshot in snapshots if os.path.basename(snapshot[2]) not in parsed]
+    if new_snapshots:
+        with ThreadPoolExecutor(max_workers=min(SPARK_INGEST_WORKERS, len(new_snapshots))) as pool:
+            results = list(pool.map(lambda snapshot: parse_spark_report(*snapshot), new_snapshots))
+        new_rows, row_issues = {}, []
+        frames = [rows for rows, _ in results if rows is not None]
+        if frames:
+            valid_rows, row_issues = validate_report_rows(pd.concat(frames, ignore_index=True))
+            new_rows = dict(tuple(prepare_store_rows(valid_rows).groupby('Source File', sort=False)))
+        for snapshot, (_, issues) in zip(new_snapshots, results):
+            name = os.path.basename(snapshot[2])
+            issues = issues + [issue for issue in row_issues if issue['File'] == name]
+            parsed[name] = (new_rows.get(name), issues)
+            for issue in issues:
+                logger.warning("SparkAI report %s, line %s: %s", issue['File'], issue['Line'], issue['Problem'])
+
+    names = [os.path.basename(path) for _, _, path in snapshots]
+    frames = [parsed[name][0] for name in names if name in parsed and parsed[name][0] is not None]
+    store = _store_dtypes(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SPARK_STORE_COLUMNS))
+    store.attrs = {
+        'format': SPARK_STORE_FORMAT,
+        'versions': {name: versions[name] for name in names if name in parsed and name in versions},
+        'issues': {name: parsed[name][1] for name in names if name in parsed and parsed[name][1]}
+    }
+    try:
+        write_spark_store(store, get_spark_store_path(spark_version))
+    except Exception:
+        # Read-only filesystem or missing pyarrow - keep the store in memory only
+        pass
+    return store
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_spark_reports(spark_version):
+    """
+    Consolidated store of every dated SparkAI report, one row per county and report.
+
+    Read from the store's Parquet file when this data version was ingested
+    before; otherwise ingested (see ingest_spark_reports).
+    """
+    store_path = get_spark_store_path(spark_version)
+    try:
+        if os.path.exists(store_path):
+            store = pd.read_parquet(store_path)
+            if store.attrs.get('format') == SPARK_STORE_FORMAT:
+                return store
+    except Exception:
+        pass
+    return ingest_spark_reports(spark_version)
+
+
+def get_spark_report_issues():
+    """Validation problems of the current SparkAI reports as a File, Line, Problem table"""
+    issues = load_spark_reports(get_spark_data_version()).attrs.get('issues', {})
+    issues = pd.DataFrame([issue for file_issues in issues.values() for issue in file_issues],
+                          columns=['File', 'Line', 'Problem'])
+    return issues.astype({'Line': 'Int64'})
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_spark_county_table(spark_version):
+    """
+    Shared, read-only table of the SparkAI county reports, newest report per state.
+
+    Taken once per SparkAI data version from the consolidated store: State and
+    Sentiment are categoricals (Sentiment limited to GOOD/MIXED/BAD/NO DATA),
+    the text columns are strings, County ID is the county's FIPS code (<NA>
+    when the name is unknown), County Key its match key (see county_matching)
+    and Report Date is the date in the report's file name.
+    """
+    store = load_spark_reports(spark_version)
+    latest_files = [os.path.basename(path) for _, _, path in get_latest_spark_files()]
+    rows = store[store['Source File'].isin(latest_files)]
+    if rows.empty:
+        return pd.DataFrame()
+    table = rows[['State', 'County ID', 'County Key', 'Sentiment', *SPARK_TEXT_COLUMNS, 'Report Date']].reset_index(drop=True)
+    table['State'] = table['State'].cat.remove_unused_categories()
+    return table
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_spark_county_index(spark_version):
+    """Hash index from county match key (see county_matching) to the county's row position (first row wins)"""
+    table = load_spark_county_table(spark_version)
+    if table.empty:
+        return {}
+    return {key: position for position, key in reversed(list(enumerate(table['County Key'])))}
+
+
+def get_spark_county_table():
+    """SparkAI county table for the current files on disk"""
+    return load_spark_county_table(get_spark_data_version())
+
+
+def lookup_spark_county(state, county):
+    """SparkAI enrichment fields (ENRICHMENT_FIELDS) of a county, or None when it has no report"""
+    spark_version = get_spark_data_version()
+    position = load_spark_county_index(spark_version).get(county_key(state, county))
+    if position is None:
+        return None
+    row = load_spark_county_table(spark_version).iloc[position]
+    return {field: str(row[field]) if pd.notna(row[field]) else default for field, default in ENRICHMENT_FIELDS.items()}
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_spark_county_sentiment(spark_version):
+    """
+    County ID (5-digit FIPS), County, State, Sentiment and report link of every SparkAI county.
+
+    Counties whose name did not resolve to a County ID are left out.
+    """
+    spark_table = load_spark_county_table(spark_version)
+    columns = ['County ID', 'County', 'State', 'Sentiment', 'Detailed Report']
+    if spark_table.empty:
+        return pd.DataFrame(columns=columns)
+    matched = spark_table.loc[spark_table['County ID'].notna(), columns]
+    matched = matched.astype({'County ID': str, 'County': str, 'State': str, 'Sentiment': str})
+    return matched.drop_duplicates('County ID', ignore_index=True)
@@ -0,0 +1,119 @@
+"""
+Bulk re-enrichment of user-added projects from the latest SparkAI county reports
+
+Run from the app directory (reads SUPABASE_URL/SUPABASE_KEY like the app):
+    python spark_enrichment.py --dry-run
+    python spark_enrichment.py
+"""
+import argparse
+import sys
+import pandas as pd
+from dotenv import load_dotenv
+from county_matching import county_keys
+from spark_data import ENRICHMENT_FIELDS, get_spark_county_table
+from supabase_config import UPSERT_BATCH_SIZE, fetch_table_rows, init_supabase, upsert_user_projects
+from tracker_data import USER_PROJECT_COLUMNS
+
+# SparkAI enrichment field -> Supabase column of user_added_projects
+ENRICHMENT_COLUMNS = {field: column for column, field in USER_PROJECT_COLUMNS.items() if field in ENRICHMENT_FIELDS}
+
+# Columns sent with every update (the identifying columns keep the upsert's insert half valid)
+PROJECT_KEY_COLUMNS = ['id', 'project', 'state', 'county']
+
+
+def spark_enrichment_table(spark_table):
+    """Enrichment values (Supabase column names) of every SparkAI county by county match key; first report per key wins"""
+    values = spark_table[list(ENRICHMENT_FIELDS)].astype('string').fillna(ENRICHMENT_FIELDS)
+    values = values.rename(columns=ENRICHMENT_COLUMNS)
+    values['County Key'] = spark_table['County Key'].to_numpy()
+    return values.drop_duplicates('County Key', ignore_index=True)
+
+
+def plan_reenrichment(projects, spark_table):
+    """
+    Projects whose SparkAI fields differ from the latest reports.
+
+    `projects` are user_added_projects rows. The whole portfolio is joined to
+    the SparkAI table in one merge on the county match key and compared field
+    by field; projects in counties without a report keep their current values.
+    Returns one row per changed project: the key columns, the new field values,
+    Old Sentiment and Changed Fields.
+    """
+    update_columns = list(ENRICHMENT_COLUMNS.values())
+    plan_columns = PROJECT_KEY_COLUMNS + update_columns + ['Old Sentiment', 'Changed Fields']
+    current = pd.DataFrame(projects).reindex(columns=PROJECT_KEY_COLUMNS + update_columns)
+    if current.empty or spark_table.empty:
+        return pd.DataFrame(columns=plan_columns)
+
+    current['County Key'] = county_keys(current['state'], current['county']).to_numpy()
+    merged = current.merge(spark_enrichment_table(spark_table), on='County Key', suffixes=('_old', ''))
+    old = merged[[f'{column}_old' for column in update_columns]].astype('string').fillna('')
+    old.columns = update_columns
+    changed = old.ne(merged[update_columns])
+    is_changed = changed.any(axis=1).to_numpy()
+
+    plan = merged.loc[is_changed, PROJECT_KEY_COLUMNS + update_columns].reset_index(drop=True)
+    plan['Old Sentiment'] = old.loc[is_changed, ENRICHMENT_COLUMNS['Sentiment']].to_numpy()
+    plan['Changed Fields'] = [
+        ', '.join(field for field, differs in zip(ENRICHMENT_COLUMNS, row) if differs)
+        for row in changed.loc[is_changed].to_numpy()
+    ]
+    return plan
+
+
+def sentiment_transitions(plan):
+    """Number of changed projects per (Old Sentiment, new sentiment)"""
+    sentiment = ENRICHMENT_COLUMNS['Sentiment']
+    return plan.groupby(['Old Sentiment', sentiment]).size().rename('Projects').reset_index() \
+        .rename(columns={sentiment: 'New Sentiment'})
+
+
+def plan_rows(plan):
+    """Supabase upsert payload of a re-enrichment plan (JSON-ready: Python values, None for missing)"""
+    rows = plan[PROJECT_KEY_COLUMNS + list(ENRICHMENT_COLUMNS.values())].astype(object)
+    return rows.where(rows.notna(), None).to_dict('records')
+
+
+def reenrich_projects(supabase, apply=True, batch_size=UPSERT_BATCH_SIZE):
+    """
+    Refresh the SparkAI fields of every user-added project.
+
+    Reads user_added_projects straight from Supabase (not from the cached
+    snapshots), plans the changes and, when `apply` is set, writes them in
+    batched upserts. Returns (plan, number of rows written); raises when the
+    projects cannot be read.
+    """
+    plan = plan_reenrichment(fetch_table_rows(supabase, 'user_added_projects'), get_spark_county_table())
+    written = 0
+    if apply and not plan.empty:
+        written = upsert_user_projects(supabase, plan_rows(plan), batch_size)
+    return plan, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the SparkAI fields of every user-added project from the latest SparkAI reports")
+    parser.add_argument('--dry-run', action='store_true', help="list the changes without writing them")
+    parser.add_argument('--batch-size', type=int, default=UPSERT_BATCH_SIZE, help="rows per upsert request")
+    args = parser.parse_args()
+
+    load_dotenv()
+    supabase = init_supabase()
+    if supabase is None:
+        print("Supabase credentials not found (SUPABASE_URL, SUPABASE_KEY)", file=sys.stderr)
+        return 1
+
+    plan, written = reenrich_projects(supabase, apply=not args.dry_run, batch_size=args.batch_size)
+    if plan.empty:
+        print("All projects are up to date.")
+        return 0
+    print(f"{len(plan)} project(s) with changed SparkAI data")
+    print(sentiment_transitions(plan).to_string(index=False))
+    if args.dry_run:
+        print(plan[['project', 'state', 'county', 'Changed Fields']].to_string(index=False))
+        return 0
+    print(f"Updated {written} of {len(plan)} project(s)")
+    return 0 if written == len(plan) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Dated SparkAI report history and county sentiment changes for the DESRI Opposition Tracker
+"""
+import streamlit as st
+from spark_data import load_spark_reports
+
+# Columns kept for every county of every dated report
+HISTORY_COLUMNS = ['State', 'County Key', 'County', 'Sentiment', 'Report Date']
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_spark_history(spark_version):
+    """
+    Sentiment of every county in every dated SparkAI report.
+
+    Taken from the consolidated report store (see spark_data.load_spark_reports):
+    one row per county match key and report date (first row wins), sorted by
+    county and date; State and Sentiment are categoricals.
+    """
+    history = load_spark_reports(spark_version)[HISTORY_COLUMNS]
+    return history.drop_duplicates(['County Key', 'Report Date']).sort_values(['County Key', 'Report Date'], ignore_index=True)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_sentiment_transitions(spark_version):
+    """
+    County sentiment changes between consecutive reports of a county (e.g. GOOD -> MIXED).
+
+    One row per change: State, County, County Key, Previous Date,
+    Report Date, Previous Sentiment and Sentiment.
+    """
+    history = load_spark_history(spark_version)
+    previous = history.groupby('County Key', sort=False)[['Report Date', 'Sentiment']].shift()
+    changed = previous['Sentiment'].notna() & history['Sentiment'].ne(previous['Sentiment'])
+    transitions = history.loc[changed, ['State', 'County', 'County Key']].assign(**{
+        'Previous Date': previous.loc[changed, 'Report Date'],
+        'Report Date': history.loc[changed, 'Report Date'],
+        'Previous Sentiment': previous.loc[changed, 'Sentiment'],
+        'Sentiment': history.loc[changed, 'Sentiment']
+    })
+    return transitions.reset_index(drop=True)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_latest_sentiment_changes(spark_version):
+    """Sentiment changes in each state's newest report, i.e. what changed since the previous drop"""
+    history = load_spark_history(spark_version)
+    transitions = get_sentiment_transitions(spark_version)
+    latest_dates = history.groupby('State', observed=True)['Report Date'].max()
+    return transitions[transitions['Report Date'].eq(transitions['State'].map(latest_dates))].reset_index(drop=True)
+
+
+def count_transitions(transitions):
+    """Number of counties per (Previous Sentiment, Sentiment) change, most common first"""
+    counts = transitions.groupby(['Previous Sentiment', 'Sentiment'], observed=True).size()
+    return counts.rename('Counties').sort_values(ascending=False).reset_index()
@@ -0,0 +1,178 @@
+"""
+Spatial index over project coordinates for the DESRI Opposition Tracker
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+from county_matching import county_fips, county_list_keys, load_county_centroids
+
+# Offset that keeps grid row/column numbers positive when they are packed into one cell key
+_CELL_OFFSET = 1 << 16
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 69.0
+
+# Radius of the "nearby projects" count on the project cards
+NEARBY_RADIUS_MILES = 25
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance in miles (vectorized over numpy arrays)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GridIndex:
+    """
+    Points bucketed into fixed-size latitude/longitude cells.
+
+    Points are sorted by cell, so the points of a cell are one contiguous slice
+    and a query only touches the cells it overlaps. Positions returned by the
+    queries refer to the arrays the index was built from; points without
+    coordinates are never returned.
+    """
+
+    def __init__(self, lat, lon, cell_size=1.0):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        self.size = len(lat)
+        self.cell_size = cell_size
+        self.positions = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        self.lat = lat[self.positions]
+        self.lon = lon[self.positions]
+
+        keys = self._cell_keys(self._cell(self.lat), self._cell(self.lon))
+        self.order = np.argsort(keys, kind='stable')
+        self.cell_keys, self.cell_starts = np.unique(keys[self.order], return_index=True)
+        self.cell_ends = np.append(self.cell_starts[1:], len(self.order))
+
+    def _cell(self, values):
+        return np.floor(np.asarray(values) / self.cell_size).astype(np.int64)
+
+    @staticmethod
+    def _cell_keys(rows, cols):
+        return (rows + _CELL_OFFSET) * (2 * _CELL_OFFSET) + (cols + _CELL_OFFSET)
+
+    def _points_in_cells(self, rows, cols):
+        """Indexes (into self.lat/self.lon) of the points in the given cell ranges"""
+        if len(rows) * len(cols) >= len(self.cell_keys):
+            return np.arange(len(self.lat))
+        wanted = self._cell_keys(rows[:, None], cols[None, :]).ravel()
+        found = np.minimum(np.searchsorted(self.cell_keys, wanted), len(self.cell_keys) - 1)
+        found = found[self.cell_keys[found] == wanted]
+        if len(found) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.order[start:end] for start, end in zip(self.cell_starts[found], self.cell_ends[found])])
+
+    def query_bbox(self, south, west, north, east):
+        """Positions of the points inside a bounding box, in ascending order"""
+        rows = np.arange(self._cell(max(south, -90)), self._cell(min(north, 90)) + 1)
+        cols = np.arange(self._cell(max(west, -180)), self._cell(min(east, 180)) + 1)
+        candidates = self._points_in_cells(rows, cols)
+        inside = (
+            (self.lat[candidates] >= south) & (self.lat[candidates] <= north) &
+            (self.lon[candidates] >= west) & (self.lon[candidates] <= east)
+        )
+        return np.sort(self.positions[candidates[inside]])
+
+    def all(self):
+        """Positions of every point with coordinates"""
+        return self.positions
+
+    def _square(self, lat, lon, cells):
+        """Cell ranges of the square reaching `cells` cells beyond the point's own cell"""
+        row, col = self._cell(lat), self._cell(lon)
+        return np.arange(row - cells, row + cells + 1), np.arange(col - cells, col + cells + 1)
+
+    def within_radius(self, lat, lon, miles):
+        """(positions, distances in miles) of the points within `miles` of a point, nearest first"""
+        lat_span = miles / MILES_PER_DEGREE
+        lon_span = miles / (MILES_PER_DEGREE * max(np.cos(np.radians(min(abs(lat) + lat_span, 89.9))), 1e-6))
+        rows = np.arange(self._cell(max(lat - lat_span, -90)), self._cell(min(lat + lat_span, 90)) + 1)
+        cols = np.arange(self._cell(max(lon - lon_span, -180)), self._cell(min(lon + lon_span, 180)) + 1)
+        candidates = self._points_in_cells(rows, cols)
+        distances = haversine_miles(lat, lon, self.lat[candidates], self.lon[candidates])
+        inside = distances <= miles
+        order = np.argsort(distances[inside], kind='stable')
+        return self.positions[candidates[inside][order]], distances[inside][order]
+
+    def nearest(self, lat, lon, k=1, exclude=()):
+        """
+        (positions, distances in miles) of the k points nearest to a point.
+
+        Searches a square of cells around the point and doubles it until the
+        k-th candidate is closer than the square's edge (or the whole grid is covered).
+        """
+        excluded = np.isin(self.positions, np.asarray(list(exclude), dtype=np.int64))
+        cells = 1
+        while True:
+            rows, cols = self._square(lat, lon, cells)
+            covers_all = len(rows) * len(cols) >= len(self.cell_keys)
+            candidates = self._points_in_cells(rows, cols)
+            candidates = candidates[~excluded[candidates]]
+            distances = haversine_miles(lat, lon, self.lat[candidates], self.lon[candidates])
+            # Any point outside the square is at least this far away
+            edge_lat = min(abs(lat) + (cells + 1) * self.cell_size, 90)
+            reach = cells * self.cell_size * MILES_PER_DEGREE * np.cos(np.radians(edge_lat))
+            if covers_all or (len(distances) >= k and np.partition(distances, k - 1)[k - 1] <= reach):
+                order = np.argsort(distances, kind='stable')[:k]
+                return self.positions[candidates[order]], distances[order]
+            cells *= 2
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_project_index(dataset_version, _df):
+    """Grid index over the project table's coordinates, built once per dataset version"""
+    return GridIndex(_df['Latitude'].to_numpy(dtype=float), _df['Longitude'].to_numpy(dtype=float))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_contested_index(report_version, _contested_df):
+    """
+    Contested projects placed at their county's centroid, with a grid index over them.
+
+    Returns (located contested projects, GridIndex); the contested report has
+    no coordinates of its own, only the County ID. A project spanning several
+    counties ('|'-separated County IDs) gets one row per county.
+    """
+    centroids = load_county_centroids()[['County ID', 'Latitude', 'Longitude']]
+    county_ids = _contested_df['County ID'].astype('string').str.split('|')
+    located = _contested_df.assign(**{'County ID': county_ids.to_numpy()}).explode('County ID', ignore_index=True)
+    located['County ID'] = county_fips(located['County ID'].str.strip()).to_numpy()
+    located = located.merge(centroids, on='County ID', how='left')
+    return located, GridIndex(located['Latitude'].to_numpy(dtype=float), located['Longitude'].to_numpy(dtype=float))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_restriction_points(report_version, _restrictions_df):
+    """
+    Restrictions placed at the centroid of every county they name (Latitude, Longitude).
+
+    The County column may list several counties separated by '|'; restrictions
+    without a county (e.g. state-level ones) or with an unknown one get no point.
+    """
+    keys = county_list_keys(_restrictions_df['State'], _restrictions_df['County'])
+    county_ids = pd.DataFrame({'County ID': [key for row_keys in keys for key in row_keys]})
+    located = county_ids.merge(load_county_centroids(), on='County ID')
+    return located[['Latitude', 'Longitude']]
+
+
+def grid_totals(lat, lon, values, cell_size):
+    """
+    Per-point values summed per grid cell.
+
+    `values` is a DataFrame with one row per point; the result has one row per
+    non-empty cell with the cell center as Latitude/Longitude plus the sums.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    rows = np.floor(lat / cell_size).astype(np.int64)
+    cols = np.floor(lon / cell_size).astype(np.int64)
+    totals = values.reset_index(drop=True).groupby([rows, cols]).sum()
+    cell_rows = totals.index.get_level_values(0).to_numpy()
+    cell_cols = totals.index.get_level_values(1).to_numpy()
+    return pd.concat([
+        pd.DataFrame({'Latitude': (cell_rows + 0.5) * cell_size, 'Longitude': (cell_cols + 0.5) * cell_size}),
+        totals.reset_index(drop=True)
+    ], axis=1)
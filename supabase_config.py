@@ -1,10 +1,29 @@
 """
 Supabase configuration for DESRI Opposition Tracker
 """
+import functools
 import os
+import threading
+import time
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from supabase import create_client, Client
 
+# Session state key of the per-rerun read cache
+REQUEST_CACHE_KEY = '_supabase_read_cache'
+
+# Latest whole-table snapshots published by the background refresher (data_refresher.py).
+# The dict is replaced, never mutated, so readers always see one consistent snapshot.
+_snapshot_lock = threading.Lock()
+_snapshots = {'tables': {}, 'refreshed_at': None, 'generation': 0}
+
+# Database view of the user-added projects that have not been removed (see DEPLOYMENT_GUIDE.md)
+ACTIVE_USER_PROJECTS_VIEW = 'active_user_added_projects'
+VIEW_SOURCES = {ACTIVE_USER_PROJECTS_VIEW: ('user_added_projects', 'removed_projects')}
+
+# Rows sent per request by bulk writes
+UPSERT_BATCH_SIZE = 500
+
 def init_supabase() -> Client:
     """Initialize Supabase client with credentials from Streamlit secrets or environment variables"""
     
@@ -40,6 +59,99 @@ def init_supabase() -> Client:
     
     return create_client(url, key)
 
+def fetch_table_rows(supabase: Client, table_name: str):
+    """Fetch every row of a table, raising on error (used by the background refresher)"""
+    return supabase.table(table_name).select("*").execute().data
+
+def get_snapshot_generation():
+    """Counter bumped whenever a write invalidates the published snapshots"""
+    return _snapshots['generation']
+
+def publish_table_snapshots(tables: dict, generation: int):
+    """Swap in fresh table snapshots, unless a write made them stale while they were fetched"""
+    global _snapshots
+    with _snapshot_lock:
+        if generation != _snapshots['generation']:
+            return False
+        _snapshots = {'tables': dict(tables), 'refreshed_at': time.time(), 'generation': generation}
+        return True
+
+def drop_snapshots():
+    """Stop serving reads from snapshots until the refresher fetches fresh ones"""
+    global _snapshots
+    with _snapshot_lock:
+        _snapshots = {'tables': {}, 'refreshed_at': None, 'generation': _snapshots['generation'] + 1}
+
+def get_table_snapshot(table_name: str):
+    """Rows of a table (or of the active projects view) from the latest snapshot, or None if there is none"""
+    tables = _snapshots['tables']
+    if table_name == ACTIVE_USER_PROJECTS_VIEW:
+        if 'user_added_projects' not in tables or 'removed_projects' not in tables:
+            return None
+        removed = {row['project'] for row in tables['removed_projects']}
+        return [row for row in tables['user_added_projects'] if row['project'] not in removed]
+    return tables.get(table_name)
+
+def get_snapshot_time():
+    """Unix time of the latest published snapshot, or None"""
+    return _snapshots['refreshed_at']
+
+def begin_request_cache():
+    """Start an empty read cache for this script run (call once at the top of every rerun)"""
+    st.session_state[REQUEST_CACHE_KEY] = {}
+
+def _get_request_cache():
+    """The current run's read cache, or None outside a script run or before begin_request_cache()"""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    return st.session_state.get(REQUEST_CACHE_KEY)
+
+def request_cached(table_name: str, query: str, from_snapshot=None):
+    """
+    Fetch each (table, query, arguments) at most once per script run.
+
+    If the table has a published snapshot, from_snapshot(rows, *args) answers
+    the query from it without contacting Supabase.
+    """
+    def decorator(fetch):
+        @functools.wraps(fetch)
+        def wrapper(supabase: Client, *args):
+            snapshot_rows = get_table_snapshot(table_name)
+            if from_snapshot is not None and snapshot_rows is not None:
+                return from_snapshot(snapshot_rows, *args)
+            cache = _get_request_cache()
+            if cache is None:
+                return fetch(supabase, *args)
+            key = (table_name, query, args)
+            if key not in cache:
+                cache[key] = fetch(supabase, *args)
+            return cache[key]
+        return wrapper
+    return decorator
+
+def invalidates(table_name: str):
+    """
+    Drop this run's cached reads of a table (and of views over it) and the snapshots when it is written.
+
+    The snapshots are dropped before and again after the write, so a refresh
+    that fetched while the write was in flight cannot publish pre-write rows.
+    """
+    def decorator(write):
+        @functools.wraps(write)
+        def wrapper(supabase: Client, *args):
+            drop_snapshots()
+            cache = _get_request_cache()
+            if cache:
+                for key in [key for key in cache if key[0] == table_name or table_name in VIEW_SOURCES.get(key[0], ())]:
+                    del cache[key]
+            try:
+                return write(supabase, *args)
+            finally:
+                drop_snapshots()
+        return wrapper
+    return decorator
+
+@request_cached('user_added_projects', 'all', lambda rows: rows)
 def get_user_added_projects(supabase: Client):
     """Fetch all user-added projects from Supabase"""
     try:
@@ -49,6 +161,52 @@ def get_user_added_projects(supabase: Client):
         st.error(f"Error fetching user projects: {e}")
         return []
 
+@request_cached('user_added_projects', 'since', lambda rows, since: [row for row in rows if row.get('updated_at') and row['updated_at'] >= since])
+def get_user_added_projects_since(supabase: Client, since: str):
+    """Fetch user-added projects inserted or updated at or after a timestamp (None on error)"""
+    try:
+        response = supabase.table('user_added_projects').select("*").gte('updated_at', since).execute()
+        return response.data
+    except Exception as e:
+        # If updated_at column doesn't exist, the caller falls back to a full fetch
+        if "updated_at does not exist" not in str(e):
+            st.error(f"Error syncing user projects: {e}")
+        return None
+
+@request_cached('user_added_projects', 'ids', lambda rows: [row['id'] for row in rows])
+def get_user_added_project_ids(supabase: Client):
+    """Fetch the ids of all user-added projects (None on error)"""
+    try:
+        response = supabase.table('user_added_projects').select("id").execute()
+        return [row['id'] for row in response.data]
+    except Exception as e:
+        st.error(f"Error syncing user projects: {e}")
+        return None
+
+@request_cached(ACTIVE_USER_PROJECTS_VIEW, 'all', lambda rows: rows)
+def get_active_user_added_projects(supabase: Client):
+    """Fetch user-added projects that have not been removed, filtered in the database (None if unavailable)"""
+    try:
+        response = supabase.table(ACTIVE_USER_PROJECTS_VIEW).select("*").execute()
+        return response.data
+    except Exception as e:
+        # If the view doesn't exist, the caller filters removed projects itself
+        if ACTIVE_USER_PROJECTS_VIEW not in str(e):
+            st.error(f"Error fetching active user projects: {e}")
+        return None
+
+@request_cached(ACTIVE_USER_PROJECTS_VIEW, 'ids', lambda rows: [row['id'] for row in rows])
+def get_active_user_added_project_ids(supabase: Client):
+    """Fetch the ids of user-added projects that have not been removed (None if unavailable)"""
+    try:
+        response = supabase.table(ACTIVE_USER_PROJECTS_VIEW).select("id").execute()
+        return [row['id'] for row in response.data]
+    except Exception as e:
+        if ACTIVE_USER_PROJECTS_VIEW not in str(e):
+            st.error(f"Error fetching active user projects: {e}")
+        return None
+
+@request_cached('removed_projects', 'all', lambda rows: rows)
 def get_removed_projects(supabase: Client):
     """Fetch all removed projects from Supabase"""
     try:
@@ -58,6 +216,29 @@ def get_removed_projects(supabase: Client):
         st.error(f"Error fetching removed projects: {e}")
         return []
 
+def get_table_version(supabase: Client, table_name: str):
+    """Return a cheap change marker for a table: (row count, latest updated_at or id)"""
+    snapshot_rows = get_table_snapshot(table_name)
+    if snapshot_rows is not None:
+        marker_column = 'updated_at' if any('updated_at' in row for row in snapshot_rows) else 'id'
+        values = [row[marker_column] for row in snapshot_rows if row.get(marker_column) is not None]
+        return len(snapshot_rows), max(values) if values else None
+    try:
+        response = supabase.table(table_name).select("updated_at", count="exact").order("updated_at", desc=True).limit(1).execute()
+        latest = response.data[0].get('updated_at') if response.data else None
+        return response.count, latest
+    except Exception as e:
+        # If updated_at column doesn't exist, fall back to the highest id
+        if "updated_at does not exist" in str(e):
+            try:
+                response = supabase.table(table_name).select("id", count="exact").order("id", desc=True).limit(1).execute()
+                latest = response.data[0].get('id') if response.data else None
+                return response.count, latest
+            except Exception:
+                return None
+        return None
+
+@invalidates('user_added_projects')
 def add_user_project(supabase: Client, project_data: dict):
     """Add a new user project to Supabase"""
     try:
@@ -67,6 +248,20 @@ def add_user_project(supabase: Client, project_data: dict):
         st.error(f"Error adding project: {e}")
         return False
 
+@invalidates('user_added_projects')
+def upsert_user_projects(supabase: Client, rows: list, batch_size: int = UPSERT_BATCH_SIZE):
+    """Upsert user-added project rows matched on id, batch_size rows per request; returns the number written"""
+    written = 0
+    try:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            supabase.table('user_added_projects').upsert(batch, on_conflict='id').execute()
+            written += len(batch)
+    except Exception as e:
+        st.error(f"Error updating projects (saved {written} of {len(rows)}): {e}")
+    return written
+
+@invalidates('removed_projects')
 def remove_project(supabase: Client, project_name: str):
     """Add a project to the removed list"""
     try:
@@ -81,6 +276,7 @@ def remove_project(supabase: Client, project_name: str):
     except Exception as e:
         return False, f"Error: {e}"
 
+@invalidates('removed_projects')
 def restore_project(supabase: Client, project_name: str):
     """Remove a project from the removed list"""
     try:
@@ -90,6 +286,7 @@ def restore_project(supabase: Client, project_name: str):
         st.error(f"Error restoring project: {e}")
         return False
 
+@invalidates('removed_projects')
 def restore_all_projects(supabase: Client):
     """Clear all removed projects"""
     try:
@@ -100,6 +297,7 @@ def restore_all_projects(supabase: Client):
         st.error(f"Error restoring all projects: {e}")
         return False
 
+@invalidates('user_added_projects')
 def delete_user_project(supabase: Client, project_name: str):
     """Delete a user-added project from Supabase"""
     try:
@@ -109,6 +307,7 @@ def delete_user_project(supabase: Client, project_name: str):
         st.error(f"Error deleting user project: {e}")
         return False
 
+@invalidates('user_added_projects')
 def update_project_survey(supabase: Client, project_name: str, survey_data: dict):
     """Update survey answers for an existing project"""
     try:
@@ -127,6 +326,7 @@ def update_project_survey(supabase: Client, project_name: str, survey_data: dict
         st.error(f"Error updating survey: {e}")
         return False, "error"
 
+@invalidates('user_added_projects')
 def add_survey_to_default_project(supabase: Client, project_data: dict):
     """Add a default project to user_added_projects table with survey answers"""
     try:
@@ -145,6 +345,7 @@ def add_survey_to_default_project(supabase: Client, project_data: dict):
         return False
 
 # Public Hearings Q&A Functions
+@request_cached('public_hearing_qa', 'all', lambda rows: rows)
 def get_public_hearing_qa(supabase: Client):
     """Fetch all public hearing Q&A items from Supabase"""
     try:
@@ -154,6 +355,7 @@ def get_public_hearing_qa(supabase: Client):
         st.error(f"Error fetching Q&A items: {e}")
         return []
 
+@invalidates('public_hearing_qa')
 def add_public_hearing_qa(supabase: Client, qa_data: dict):
     """Add a new Q&A item to Supabase"""
     try:
@@ -163,6 +365,7 @@ def add_public_hearing_qa(supabase: Client, qa_data: dict):
         st.error(f"Error adding Q&A item: {e}")
         return False
 
+@invalidates('public_hearing_qa')
 def update_public_hearing_qa(supabase: Client, qa_id: int, qa_data: dict):
     """Update an existing Q&A item in Supabase"""
     try:
@@ -172,6 +375,7 @@ def update_public_hearing_qa(supabase: Client, qa_id: int, qa_data: dict):
         st.error(f"Error updating Q&A item: {e}")
         return False
 
+@invalidates('public_hearing_qa')
 def delete_public_hearing_qa(supabase: Client, qa_id: int):
     """Delete a Q&A item from Supabase"""
     try:
@@ -181,6 +385,7 @@ def delete_public_hearing_qa(supabase: Client, qa_id: int):
         st.error(f"Error deleting Q&A item: {e}")
         return False
 
+@invalidates('public_hearing_qa')
 def soft_delete_public_hearing_qa(supabase: Client, qa_id: int):
     """Soft delete a Q&A item by marking it as removed"""
     try:
@@ -195,6 +400,7 @@ def soft_delete_public_hearing_qa(supabase: Client, qa_id: int):
             st.error(f"Error removing Q&A item: {e}")
             return False
 
+@invalidates('public_hearing_qa')
 def restore_public_hearing_qa(supabase: Client, qa_id: int):
     """Restore a soft-deleted Q&A item"""
     try:
@@ -204,6 +410,7 @@ def restore_public_hearing_qa(supabase: Client, qa_id: int):
         st.error(f"Error restoring Q&A item: {e}")
         return False
 
+@request_cached('public_hearing_qa', 'removed', lambda rows: [row for row in rows if row.get('is_removed') is True])
 def get_removed_public_hearing_qa(supabase: Client):
     """Fetch all removed Q&A items from Supabase"""
     try:
@@ -217,6 +424,7 @@ def get_removed_public_hearing_qa(supabase: Client):
             st.error(f"Error fetching removed Q&A items: {e}")
             return []
 
+@request_cached('public_hearing_qa', 'active', lambda rows: [row for row in rows if not row.get('is_removed')])
 def get_active_public_hearing_qa(supabase: Client):
     """Fetch only active (non-removed) Q&A items from Supabase"""
     try:
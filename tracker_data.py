@@ -0,0 +1,539 @@
+"""
+Data loading and caching for the DESRI Opposition Tracker
+"""
+import hashlib
+import os
+import threading
+import time
+import pandas as pd
+import streamlit as st
+from county_matching import resolve_counties
+from tracker_map import add_map_labels
+from supabase_config import (
+    get_user_added_projects,
+    get_user_added_projects_since,
+    get_user_added_project_ids,
+    get_active_user_added_projects,
+    get_active_user_added_project_ids,
+    get_removed_projects,
+    get_table_version
+)
+
+# Copy-on-write keeps per-session slices of the shared tables from writing back into them
+# (always on from pandas 3)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Tracker workbooks in order of preference: (path, sheet name)
+TRACKER_DATA_FILES = [
+    ('DESRI_PowerBI_Complete.xlsx', 'Fact_Projects'),
+    ('desri_public_opps_major_tracker_with_counties_corrected.xlsx', 0),
+    ('desri_public_opps_major_tracker_with_counties.xlsx', 0)
+]
+
+# Columnar snapshots of the tracker workbooks, rebuilt when the source hash changes
+SNAPSHOT_DIR = '.snapshots'
+
+# 2025 Opposition Report tables
+RESTRICTIONS_FILE = '2025-Restrictions.csv'
+CONTESTED_PROJECTS_FILE = '2025-Contested-Projects.csv'
+
+# Legacy local files used when Supabase is not configured
+LEGACY_USER_PROJECTS_FILE = 'user_added_projects.csv'
+LEGACY_REMOVED_PROJECTS_FILE = 'removed_projects.csv'
+
+# How long (seconds) a dataset version check is reused before Supabase is asked again
+VERSION_CHECK_TTL = 5
+
+# Supabase column names -> tracker column names
+USER_PROJECT_COLUMNS = {
+    'project': 'Project',
+    'state': 'State',
+    'county': 'County',
+    'type': 'Type',
+    'status': 'Status',
+    'latitude': 'Latitude',
+    'longitude': 'Longitude',
+    'system_size_mw_ac': 'System Size (MW AC)',
+    'system_size_mw_dc': 'System Size (MW DC)',
+    'sentiment': 'Sentiment',
+    'sentiment_detail': 'Sentiment Detail',
+    'mentions_of_moratoria': 'Mentions of Moratoria',
+    'recent_projects': 'Recent Projects'
+}
+
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORY_COLUMNS = ['State', 'County', 'Type', 'Status']
+SENTIMENT_CATEGORIES = ['GOOD', 'MIXED', 'BAD', 'NO DATA']
+MW_COLUMNS = ['System Size (MW AC)', 'System Size (MW DC)']
+
+# Map survey question columns to their full text
+SURVEY_QUESTIONS = {
+    'survey_q1': 'Can you describe any initial public opposition to the project - including when it occurred, its tone, scale, and level of organization, and the permitting stage it emerged in? Who were the most vocal opponents and supporters (if any)? If there was little or no opposition, please describe your community interactions, including any key supporters or positive dynamics that helped ease the permitting process.',
+    'survey_q2': 'What were the most prominent concerns or recurring public fears raised by the community at this project? What type of approval(s) were being sought?',
+    'survey_q3': 'Regarding this project, what forms of community engagement were used, and were they helpful? Do you believe engagement made - or could have made - a positive difference in the project\'s outcome? If so, which approaches were or would have been most effective?',
+    'survey_q4': 'What were some of the most difficult or unexpected questions you\'ve been asked during public hearings, community meetings and/or public interactions regarding this project? How did you respond - or how do you wish you had responded?',
+    'survey_q5': 'If the project succeeded with minimal or manageable opposition, what do you think made the difference?',
+    'survey_q6': 'If opposition caused significant delay or failure, what factors do you believe contributed?',
+    'survey_q7': 'Did public opposition affect project timeline and to what degree?',
+    'survey_q8': '(OPTIONAL) Is there anything else you\'d like to share that didn\'t fit into the questions above?'
+}
+SURVEY_KEYS = list(SURVEY_QUESTIONS)
+
+
+def normalize_question(text):
+    """Normalise survey question text for matching (dashes, quotes, spacing, case, trailing ' (')"""
+    text = str(text).replace('\u2014', '-').replace('\u2019', "'").replace('\u2018', "'")
+    return ' '.join(text.split()).rstrip(' (').casefold()
+
+
+# Normalised full question text -> survey key
+QUESTION_KEYS = {normalize_question(question): key for key, question in SURVEY_QUESTIONS.items()}
+
+
+def get_survey_columns(df):
+    """Map the survey answer columns of a DataFrame (survey_qN or full question text) to survey keys"""
+    columns = {}
+    for col in df.columns:
+        if col in SURVEY_QUESTIONS:
+            columns[col] = col
+        else:
+            key = QUESTION_KEYS.get(normalize_question(col))
+            if key:
+                columns[col] = key
+    return columns
+
+
+def get_tracker_source():
+    """Return (path, sheet) of the first tracker workbook found, or (None, None)"""
+    for path, sheet in TRACKER_DATA_FILES:
+        if os.path.exists(path):
+            return path, sheet
+    return None, None
+
+
+def get_file_version(path):
+    """Cheap change marker for a local file: (path, mtime, size), or None if missing"""
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def get_file_hash(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_snapshot_path(path, sheet, source_hash):
+    """Parquet snapshot path for a workbook sheet at a given content hash"""
+    base_name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(SNAPSHOT_DIR, f"{base_name}.{sheet}.{source_hash[:16]}.parquet")
+
+
+def write_snapshot(df, snapshot_path):
+    """Atomically write a Parquet snapshot and drop older snapshots of the same sheet"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    df = df.copy()
+    # Parquet needs one type per column - store mixed text/number cells as text
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda v: v if pd.isna(v) or isinstance(v, str) else str(v))
+    tmp_path = f"{snapshot_path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, snapshot_path)
+
+    prefix = os.path.basename(snapshot_path).rsplit('.', 2)[0] + '.'
+    for name in os.listdir(SNAPSHOT_DIR):
+        old_path = os.path.join(SNAPSHOT_DIR, name)
+        if name.startswith(prefix) and name.endswith('.parquet') and old_path != snapshot_path:
+            os.remove(old_path)
+
+
+def read_tracker_workbook(path, sheet):
+    """
+    Read a tracker workbook through its Parquet snapshot.
+
+    The snapshot is built the first time a workbook is seen and rebuilt only
+    when the workbook's content hash changes; if it cannot be read or written
+    the workbook is parsed directly.
+    """
+    snapshot_path = None
+    try:
+        snapshot_path = get_snapshot_path(path, sheet, get_file_hash(path))
+        if os.path.exists(snapshot_path):
+            return pd.read_parquet(snapshot_path)
+    except Exception:
+        pass
+
+    df = pd.read_excel(path, sheet_name=sheet)
+    if snapshot_path:
+        try:
+            write_snapshot(df, snapshot_path)
+        except Exception:
+            # Read-only filesystem or missing pyarrow - keep serving from the workbook
+            pass
+    return df
+
+
+@st.cache_resource
+def get_local_write_state():
+    """Process-wide count of project data changes made from this app (part of the dataset version)"""
+    return {'count': 0, 'lock': threading.Lock()}
+
+
+@st.cache_resource
+def get_user_project_sync_state():
+    """Process-wide local copy of user_added_projects used for delta syncs"""
+    return {
+        'rows': {},               # id -> row
+        'high_water_mark': None,  # latest updated_at seen
+        'delta_supported': True,
+        'view_supported': True,   # active_user_added_projects view exists
+        'lock': threading.Lock()
+    }
+
+
+def sync_user_added_projects(supabase):
+    """
+    Return all user-added projects, fetching only what changed since the last sync.
+
+    The first call does a full fetch; later calls fetch rows updated at or after
+    the high-water mark plus the id list (to drop deleted rows). Tables without
+    an updated_at column fall back to a full fetch every time.
+
+    When the active_user_added_projects view exists, removed projects are
+    filtered out by the database: full fetches and the id list come from the
+    view, so removed rows are never downloaded or kept.
+    """
+    state = get_user_project_sync_state()
+    with state['lock']:
+        changed_rows = None
+        live_ids = None
+        if state['high_water_mark'] is not None and state['delta_supported']:
+            changed_rows = get_user_added_projects_since(supabase, state['high_water_mark'])
+            if changed_rows is None:
+                state['delta_supported'] = False
+            else:
+                if state['view_supported']:
+                    live_ids = get_active_user_added_project_ids(supabase)
+                    state['view_supported'] = live_ids is not None
+                if not state['view_supported']:
+                    live_ids = get_user_added_project_ids(supabase)
+                # Ids we have never seen and did not just receive (e.g. a restored project) need a full fetch
+                if live_ids is not None:
+                    live_ids = set(live_ids)
+                    if live_ids - state['rows'].keys() - {row['id'] for row in changed_rows}:
+                        live_ids = None
+
+        if changed_rows is None or live_ids is None:
+            # Full refresh
+            rows = get_active_user_added_projects(supabase) if state['view_supported'] else None
+            if rows is None:
+                state['view_supported'] = False
+                rows = get_user_added_projects(supabase)
+            if any('id' not in row for row in rows):
+                return rows
+            state['rows'] = {row['id']: row for row in rows}
+        else:
+            state['rows'] = {row_id: row for row_id, row in state['rows'].items() if row_id in live_ids}
+            for row in changed_rows:
+                if row['id'] in live_ids:
+                    state['rows'][row['id']] = row
+
+        timestamps = [row['updated_at'] for row in state['rows'].values() if row.get('updated_at')]
+        state['high_water_mark'] = max(timestamps) if timestamps else None
+        return sorted(state['rows'].values(), key=lambda row: row['id'])
+
+
+@st.cache_data(ttl=VERSION_CHECK_TTL, show_spinner=False)
+def get_dataset_version(_supabase):
+    """
+    Build the version key of the merged project table.
+
+    The key changes only when the tracker workbook is replaced, when the
+    Supabase tables it is merged with change (row count or latest update) or
+    when this app writes project data - a write can leave the table markers
+    as they were (e.g. an edit on a table without updated_at).
+    """
+    source_path, _ = get_tracker_source()
+    version = [get_file_version(source_path), get_local_write_state()['count']]
+
+    if _supabase:
+        user_marker = get_table_version(_supabase, 'user_added_projects')
+        removed_marker = get_table_version(_supabase, 'removed_projects')
+        version += [user_marker, removed_marker]
+        if user_marker is None or removed_marker is None:
+            # Markers unavailable - fall back to refreshing once a minute
+            version.append(int(time.time() // 60))
+    else:
+        version += [
+            get_file_version(LEGACY_USER_PROJECTS_FILE),
+            get_file_version(LEGACY_REMOVED_PROJECTS_FILE)
+        ]
+
+    return tuple(version)
+
+
+def build_project_table(_supabase):
+    """Load the tracker workbook merged with user-added projects, minus removed projects"""
+    try:
+        # Try to load the processed data
+        source_path, sheet = get_tracker_source()
+        if source_path:
+            df = read_tracker_workbook(source_path, sheet)
+        else:
+            # Create sample data for demonstration
+            df = pd.DataFrame({
+                'Project': ['Sample Project 1', 'Sample Project 2'],
+                'State': ['CA', 'TX'],
+                'County': ['Los Angeles County', 'Harris County'],
+                'Sentiment': ['GOOD', 'MIXED'],
+                'Latitude': [34.0522, 29.7604],
+                'Longitude': [-118.2437, -95.3698]
+            })
+
+        # Merge with user-added projects from Supabase
+        if _supabase:
+            user_projects = sync_user_added_projects(_supabase)
+            if user_projects:
+                # Convert Supabase data to DataFrame
+                user_df = pd.DataFrame(user_projects)
+                # Rename columns to match expected format
+                user_df = user_df.rename(columns=USER_PROJECT_COLUMNS)
+                # Combine the dataframes
+                df = pd.concat([df, user_df], ignore_index=True)
+
+        # Also check for legacy CSV files (for backward compatibility)
+        elif os.path.exists(LEGACY_USER_PROJECTS_FILE):
+            user_df = pd.read_csv(LEGACY_USER_PROJECTS_FILE)
+            df = pd.concat([df, user_df], ignore_index=True)
+
+        # Remove projects that have been marked for removal
+        if _supabase:
+            removed_projects_data = get_removed_projects(_supabase)
+            if removed_projects_data:
+                removed_projects = [p['project'] for p in removed_projects_data]
+                df = exclude_removed_projects(df, removed_projects)
+        # Also check for legacy CSV file
+        elif os.path.exists(LEGACY_REMOVED_PROJECTS_FILE):
+            removed_df = pd.read_csv(LEGACY_REMOVED_PROJECTS_FILE)
+            df = exclude_removed_projects(df, removed_df['Project'])
+
+        # Flag every row of a project that has at least one survey answer,
+        # then keep the answers themselves out of the map/filter table
+        survey_columns = list(get_survey_columns(df))
+        df = df.assign(has_survey=df['Project'].isin(df.loc[has_answers(df, survey_columns), 'Project']))
+        return df.drop(columns=survey_columns)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return pd.DataFrame()
+
+
+def project_keys(names):
+    """Stable 64-bit key of each project name (ignores case and surrounding whitespace)"""
+    normalized = pd.Series(names, dtype='string').str.strip().str.casefold()
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+
+def project_ids(names):
+    """
+    Stable ID of each project row, as a 16-digit hex string.
+
+    Hashes the project key together with the row's occurrence number among rows
+    of the same project, so duplicate names still get distinct IDs and an ID
+    survives reloads of the dataset.
+    """
+    keys = pd.Series(project_keys(names))
+    occurrence = keys.groupby(keys, sort=False).cumcount()
+    hashed = pd.util.hash_pandas_object(pd.DataFrame({'key': keys, 'occurrence': occurrence}), index=False)
+    return hashed.map('{:016x}'.format).to_numpy(dtype=object)
+
+
+def exclude_removed_projects(df, removed_names):
+    """Anti-join: drop the rows whose project key is in the hashed set of removed keys"""
+    removed_keys = pd.Index(project_keys(removed_names)).unique()
+    return df[~pd.Index(project_keys(df['Project'])).isin(removed_keys)]
+
+
+def has_answers(df, columns):
+    """Boolean mask of the rows with a non-blank value in any of the given columns"""
+    answered = pd.Series(False, index=df.index)
+    for col in columns:
+        answered |= df[col].notna() & (df[col].astype(str).str.strip() != '')
+    return answered
+
+
+def extract_surveys(df):
+    """Project + survey_q1..q8 answers of the rows that answered at least one question"""
+    columns = get_survey_columns(df)
+    if 'Project' not in df.columns or not columns:
+        return pd.DataFrame(columns=['Project'] + SURVEY_KEYS)
+    surveys = df[['Project'] + list(columns)].rename(columns=columns)
+    surveys = surveys.reindex(columns=['Project'] + SURVEY_KEYS)
+    for key in SURVEY_KEYS:
+        # Blank answers count as unanswered
+        surveys[key] = surveys[key].where(has_answers(surveys, [key]))
+    return surveys.dropna(subset=SURVEY_KEYS, how='all')
+
+
+def build_survey_store(supabase):
+    """
+    Survey answers keyed by project name.
+
+    Answers come from the tracker workbook and from user_added_projects;
+    for each question a non-empty Supabase answer overrides the workbook.
+    The user-added rows are the process-wide synced copy (see
+    sync_user_added_projects), which already carries the survey columns, so
+    the answers are not downloaded a second time.
+    """
+    frames = []
+    source_path, sheet = get_tracker_source()
+    if source_path:
+        frames.append(extract_surveys(read_tracker_workbook(source_path, sheet)))
+    if supabase:
+        user_projects = sync_user_added_projects(supabase)
+        if user_projects:
+            frames.append(extract_surveys(pd.DataFrame(user_projects).rename(columns={'project': 'Project'})))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=SURVEY_KEYS, index=pd.Index([], name='Project'))
+    return pd.concat(frames, ignore_index=True).groupby('Project', sort=False)[SURVEY_KEYS].last()
+
+
+def compact_project_table(df):
+    """
+    Normalise the project table to compact dtypes.
+
+    State, County, Type and Status become categoricals (whitespace stripped),
+    Sentiment becomes a categorical with the fixed GOOD/MIXED/BAD/NO DATA
+    categories (anything else counts as NO DATA) and the MW sizes become numbers
+    (float64, so the reported sizes keep their exact values).
+    """
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            values = df[col].where(df[col].isna(), df[col].astype(str).str.strip())
+            df[col] = values.astype('category')
+    if 'Sentiment' in df.columns:
+        sentiment = df['Sentiment'].astype(str).str.strip().str.upper()
+        sentiment = sentiment.where(sentiment.isin(SENTIMENT_CATEGORIES), 'NO DATA')
+        df['Sentiment'] = pd.Categorical(sentiment, categories=SENTIMENT_CATEGORIES)
+    for col in MW_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    return df
+
+
+def memory_report(df):
+    """Per-column memory usage of a DataFrame, largest first"""
+    usage = df.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({
+        'Column': usage.index,
+        'Dtype': [str(df[col].dtype) for col in usage.index],
+        'Memory (KB)': (usage.values / 1024).round(1)
+    })
+    return report.sort_values('Memory (KB)', ascending=False, ignore_index=True)
+
+
+@st.cache_resource(max_entries=2, show_spinner="Loading project data...")
+def load_data(dataset_version, _supabase):
+    """
+    Shared merged project table for a dataset version.
+
+    One copy is held per process and handed to every session, so callers must
+    treat it as read-only: filter with boolean masks or index positions and
+    never assign into it. Every row gets a Project_ID and the County ID (FIPS)
+    its State/County resolve to, and the map tooltip and details card of every
+    project are prepared here as well.
+    """
+    df = compact_project_table(build_project_table(_supabase)).reset_index(drop=True)
+    df = df.assign(Project_ID=project_ids(df['Project']) if 'Project' in df.columns else None)
+    if {'State', 'County'} <= set(df.columns):
+        df['County ID'] = resolve_counties(df['State'].astype(object), df['County'].astype(object)).to_numpy()
+    return add_map_labels(df)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_project_lookup(dataset_version, _df):
+    """Hash index from Project_ID to row position, built once per dataset version"""
+    return dict(zip(_df['Project_ID'], range(len(_df))))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_project_names(dataset_version, _df):
+    """Sorted unique project names, as an Index for O(1) position lookups"""
+    return pd.Index(sorted(_df['Project'].dropna().unique().tolist()))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_report_tables(report_version):
+    """Shared, read-only 2025 report tables: (restrictions_df, contested_df)"""
+    try:
+        # Load restrictions data
+        restrictions_df = pd.read_csv(RESTRICTIONS_FILE, encoding='utf-8-sig')
+        # Load contested projects data
+        contested_df = pd.read_csv(CONTESTED_PROJECTS_FILE, encoding='utf-8-sig')
+        contested_df['State_List'] = contested_df['State'].str.split('|')
+        return restrictions_df, contested_df
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return None, None
+
+
+def get_report_version():
+    """Change marker of the 2025 report files"""
+    return get_file_version(RESTRICTIONS_FILE), get_file_version(CONTESTED_PROJECTS_FILE)
+
+
+def report_files_available():
+    """True when both 2025 report files are on disk"""
+    return os.path.exists(RESTRICTIONS_FILE) and os.path.exists(CONTESTED_PROJECTS_FILE)
+
+
+def load_opposition_data():
+    """2025 report tables for the current files on disk"""
+    return load_report_tables(get_report_version())
+
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def get_memory_report(dataset_version, _df):
+    """Memory report of the shared project table for a dataset version"""
+    return memory_report(_df)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_survey_store(dataset_version, _supabase):
+    """
+    Shared survey store for a dataset version (read-only).
+
+    Kept apart from the project table and only built when a project card or
+    the survey tab asks for it.
+    """
+    try:
+        return build_survey_store(_supabase)
+    except Exception as e:
+        st.error(f"Error loading survey responses: {e}")
+        return pd.DataFrame(columns=SURVEY_KEYS, index=pd.Index([], name='Project'))
+
+
+def get_project_survey(survey_store, project_name):
+    """Answered survey questions of one project as {survey_qN: answer}"""
+    if project_name not in survey_store.index:
+        return {}
+    answers = survey_store.loc[project_name]
+    return {key: str(answers[key]) for key in SURVEY_KEYS if pd.notna(answers[key])}
+
+
+def refresh_project_data():
+    """Drop cached project data after a change made from this app (every dataset-versioned cache moves on)"""
+    write_state = get_local_write_state()
+    with write_state['lock']:
+        write_state['count'] += 1
+    st.cache_data.clear()
+    load_data.clear()
+    load_survey_store.clear()
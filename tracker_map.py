@@ -0,0 +1,728 @@
+"""
+Map layers for the DESRI Opposition Tracker
+"""
+import json
+import folium
+import numpy as np
+import pandas as pd
+import streamlit as st
+from folium.plugins import Fullscreen, HeatMap
+from folium.utilities import JsCode
+from jinja2 import Template
+from streamlit_folium import (
+    _component_func,
+    _get_feature_group_string,
+    _get_header,
+    _get_html,
+    _get_map_string,
+    generate_js_hash,
+    get_full_id
+)
+from county_boundaries import COUNTY_ZOOM_TIERS, feature_bounds, get_county_boundaries, get_zoom_tier
+from spark_data import load_spark_county_sentiment
+from spatial_index import get_project_index, grid_totals
+
+# Marker fill color by community sentiment
+SENTIMENT_COLORS = {
+    'GOOD': '#2ecc71',
+    'MIXED': '#f39c12',
+    'BAD': '#e74c3c',
+    'NO DATA': '#95a5a6'
+}
+
+# ArcGIS basemap tiles by name
+ARCGIS_BASEMAPS = {
+    "Dark Gray": {
+        "url": "https://services.arcgisonline.com/ArcGIS/rest/services/Canvas/World_Dark_Gray_Base/MapServer/tile/{z}/{y}/{x}",
+        "attr": "Esri, HERE, Garmin, © OpenStreetMap contributors, and the GIS User Community"
+    },
+    "Satellite": {
+        "url": "https://services.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
+        "attr": "Esri, DigitalGlobe, GeoEye, Earthstar Geographics, CNES/Airbus DS, USDA, USGS, AeroGRID, IGN"
+    },
+    "Topographic": {
+        "url": "https://services.arcgisonline.com/ArcGIS/rest/services/World_Topo_Map/MapServer/tile/{z}/{y}/{x}",
+        "attr": "Esri, HERE, Garmin, Intermap, increment P Corp., GEBCO, USGS, FAO, NPS, NRCAN, GeoBase, IGN"
+    },
+    "Streets": {
+        "url": "https://services.arcgisonline.com/ArcGIS/rest/services/World_Street_Map/MapServer/tile/{z}/{y}/{x}",
+        "attr": "Esri, HERE, Garmin, USGS, Intermap, INCREMENT P, NRCan, Esri Japan, METI, Esri China (Hong Kong)"
+    },
+    "Oceans": {
+        "url": "https://services.arcgisonline.com/ArcGIS/rest/services/Ocean/World_Ocean_Base/MapServer/tile/{z}/{y}/{x}",
+        "attr": "Esri, GEBCO, NOAA, National Geographic, Garmin, HERE, Geonames.org, and other contributors"
+    }
+}
+
+# Initial map view (center of the US)
+MAP_CENTER = [39.8283, -98.5795]
+MAP_ZOOM_START = 4
+
+# Server-side clustering: grid cell size in screen pixels and the deepest clustered zoom
+CLUSTER_RADIUS_PX = 60
+MAX_CLUSTER_ZOOM = 12
+
+# Cluster mode only sends the clusters around the viewport, snapped outward to a grid this
+# many map tiles wide so that small pans reuse the same layer
+CLUSTER_VIEW_TILES = 2
+
+# Viewport mode: most individual markers drawn before falling back to a density summary
+VIEWPORT_MARKER_CAP = 500
+
+# County sentiment choropleth: pane below the project markers, and the grid (degrees) its
+# viewport is snapped to so that small pans reuse the same layer
+COUNTY_PANE = 'counties'
+COUNTY_VIEW_GRID = 1.0
+
+# Opposition heatmap: grid cell size in degrees and the default weight of each source
+HEATMAP_CELL_DEGREES = 0.25
+OPPOSITION_WEIGHTS = {
+    'BAD projects': 1.0,
+    'MIXED projects': 0.5,
+    'Contested projects': 1.0,
+    'Local restrictions': 0.75
+}
+
+# Project columns carried as GeoJSON feature properties; the details are rendered on click
+FEATURE_COLUMNS = ['Project_ID', 'Project', 'Sentiment', 'Map_Tooltip']
+
+
+def build_project_features(df_map):
+    """
+    GeoJSON FeatureCollection of the projects, built column by column.
+
+    Missing values become null and every value is a plain Python scalar, so the
+    collection serializes straight to JSON.
+    """
+    columns = [col for col in FEATURE_COLUMNS if col in df_map.columns]
+    properties = df_map[columns].astype(object)
+    properties = properties.where(properties.notna(), None)
+    if 'Sentiment' in properties.columns:
+        properties['Sentiment'] = properties['Sentiment'].fillna('NO DATA')
+
+    coordinates = zip(df_map['Longitude'].tolist(), df_map['Latitude'].tolist())
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': list(point)}, 'properties': props}
+            for point, props in zip(coordinates, properties.to_dict('records'))
+        ]
+    }
+
+
+def project_geojson_layer(df_map):
+    """
+    All projects as one GeoJSON layer of circle markers, colored by Sentiment.
+
+    The color lookup runs in the browser from each feature's properties, so the
+    page carries one small style table instead of a style per marker.
+    """
+    features = build_project_features(df_map)
+    has_tooltip = bool(features['features']) and 'Map_Tooltip' in features['features'][0]['properties']
+    set_color = JsCode(f"""
+        function(feature, layer) {{
+            var colors = {json.dumps(SENTIMENT_COLORS)};
+            layer.setStyle({{fillColor: colors[feature.properties.Sentiment] || colors['NO DATA']}});
+        }}
+    """)
+    return folium.GeoJson(
+        features,
+        name='Projects',
+        marker=folium.CircleMarker(radius=10, color='white', weight=2, fill=True, fill_opacity=0.8),
+        on_each_feature=set_color,
+        tooltip=folium.GeoJsonTooltip(fields=['Map_Tooltip'], labels=False) if has_tooltip else None,
+        zoom_on_click=False
+    )
+
+
+class ProjectFeature(folium.MacroElement):
+    """
+    GeoJSON properties attached to a marker (Leaflet's layer.feature).
+
+    A click on the marker then reports them in st_folium's last_active_drawing,
+    as long as the marker sits in a feature group.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            {{ this._parent.get_name() }}.feature = {type: 'Feature', properties: {{ this.properties|tojson }}};
+        {% endmacro %}
+    """)
+
+    def __init__(self, properties):
+        super().__init__()
+        self._name = 'ProjectFeature'
+        self.properties = properties
+
+
+def project_marker(row):
+    """Circle marker of one project (details are shown below the map when it is clicked)"""
+    marker = folium.CircleMarker(
+        location=[row['Latitude'], row['Longitude']],
+        radius=10,
+        tooltip=row['Map_Tooltip'],
+        color='white',
+        weight=2,
+        fillColor=SENTIMENT_COLORS.get(row.get('Sentiment'), '#95a5a6'),
+        fillOpacity=0.8
+    )
+    marker.add_child(ProjectFeature({'Project_ID': row['Project_ID']}))
+    return marker
+
+
+def build_tracker_map(df_map, basemap_option, cluster_markers, map_rendering):
+    """Tracker map with the selected basemap, project markers, legend and controls"""
+    # Create base map centered on US
+    m = folium.Map(
+        location=MAP_CENTER,
+        zoom_start=MAP_ZOOM_START,
+        tiles=None,
+        prefer_canvas=True,
+        zoom_control=True,
+        scrollWheelZoom=True,  # This enables scroll wheel zoom!
+        dragging=True,
+        doubleClickZoom=True,
+        touchZoom=True,
+        keyboard=True
+    )
+
+    # Add selected basemap
+    basemap = ARCGIS_BASEMAPS[basemap_option]
+    folium.TileLayer(
+        tiles=basemap["url"],
+        attr=basemap["attr"],
+        name=basemap_option,
+        overlay=False,
+        control=True
+    ).add_to(m)
+
+    # Add reference overlay for Dark Gray basemap
+    if basemap_option == "Dark Gray":
+        folium.TileLayer(
+            tiles="https://services.arcgisonline.com/ArcGIS/rest/services/Canvas/World_Dark_Gray_Reference/MapServer/tile/{z}/{y}/{x}",
+            attr="Esri",
+            name="Labels",
+            overlay=True,
+            control=True
+        ).add_to(m)
+
+    # Add controls
+    Fullscreen(position='topleft').add_to(m)
+
+    # Pane for the county choropleth, which show_tracker_map draws on demand
+    folium.map.CustomPane(COUNTY_PANE, z_index=350, pointer_events=True).add_to(m)
+
+    # Add markers (clusters and viewport markers depend on the view and are drawn by show_tracker_map)
+    static_markers = not cluster_markers and map_rendering != "Viewport only"
+    if static_markers and map_rendering == "Single GeoJSON layer":
+        project_geojson_layer(df_map).add_to(m)
+    elif static_markers:
+        # Grouped so that marker clicks report the project's feature properties
+        layer = folium.FeatureGroup(name='Projects')
+        for idx, row in df_map.iterrows():
+            project_marker(row).add_to(layer)
+        layer.add_to(m)
+
+    # Add legend
+    counts = df_map['Sentiment'].value_counts() if 'Sentiment' in df_map.columns else pd.Series(dtype=int)
+    legend_html = f'''
+    <div style="position: fixed; 
+                    bottom: 50px; left: 50px; width: 180px; 
+                    background-color: rgba(255, 255, 255, 0.95);
+                    border: 2px solid black;
+                    z-index: 1000; font-size: 14px;
+                    border-radius: 5px; padding: 15px;">
+            <p style="margin: 0 0 10px 0; font-weight: bold; color: black;">Sentiment Legend</p>
+            <p style="margin: 5px 0; color: black;"><span style="color: {SENTIMENT_COLORS['GOOD']};">●</span> Good ({counts.get('GOOD', 0)})</p>
+            <p style="margin: 5px 0; color: black;"><span style="color: {SENTIMENT_COLORS['MIXED']};">●</span> Mixed ({counts.get('MIXED', 0)})</p>
+            <p style="margin: 5px 0; color: black;"><span style="color: {SENTIMENT_COLORS['BAD']};">●</span> Bad ({counts.get('BAD', 0)})</p>
+            <p style="margin: 5px 0; color: black;"><span style="color: {SENTIMENT_COLORS['NO DATA']};">●</span> No Data ({counts.get('NO DATA', 0)})</p>
+    </div>
+    '''
+    m.get_root().html.add_child(folium.Element(legend_html))
+
+    # Add layer control
+    folium.LayerControl(position='topright').add_to(m)
+    return m
+
+
+def _walk_elements(element):
+    """The element and all of its descendants"""
+    yield element
+    for child in element._children.values():
+        yield from _walk_elements(child)
+
+
+def map_payload(m, plugins=()):
+    """
+    What the st_folium component needs to draw a map: page script, html, header,
+    map id, CSS/JS links and the default return values.
+
+    Generating these strings is the slow part of st_folium on a large map, so
+    the cached tracker maps keep the payload and show_tracker_map hands it to
+    the component as is. Generation renames the map's elements, so the map is
+    not used again afterwards. `plugins` are element classes (e.g. HeatMap)
+    whose scripts the page loads for layers drawn over the map later.
+    """
+    m.get_root().render()
+    html = _get_html(m)
+    header = _get_header(m)
+    script = _get_map_string(m)
+    elements = list(_walk_elements(m)) + list(plugins)
+    (south, west), (north, east) = m.get_bounds()
+    return {
+        'script': script,
+        'html': html,
+        'header': header,
+        'id': get_full_id(m),
+        'hash': generate_js_hash(script),
+        'css_links': list(dict.fromkeys(href for element in elements for _, href in getattr(element, 'default_css', []))),
+        'js_links': list(dict.fromkeys(src for element in elements for _, src in getattr(element, 'default_js', []))),
+        'defaults': {
+            'last_active_drawing': None,
+            'zoom': m.options.get('zoom'),
+            'bounds': {'_southWest': {'lat': south, 'lng': west}, '_northEast': {'lat': north, 'lng': east}}
+        }
+    }
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_tracker_map(dataset_version, basemap_option, cluster_markers, map_rendering, _df, heatmap=False):
+    """
+    Tracker map payload (see map_payload) built once per dataset version and map
+    options, then shared by every session.
+
+    With `heatmap` the page also loads the HeatMap plugin, so the heatmap layer
+    (see get_heatmap_layer) can be drawn over the map.
+    """
+    df_map = _df.dropna(subset=['Latitude', 'Longitude'])
+    return map_payload(build_tracker_map(df_map, basemap_option, cluster_markers, map_rendering),
+                       plugins=[HeatMap] if heatmap else [])
+
+
+def layer_script(layer, slot):
+    """
+    Page script that draws a feature group over a tracker map (show_tracker_map's layers).
+
+    `slot` names the layer's variables, so layers of different slots can be
+    drawn together.
+    """
+    return _get_feature_group_string(layer, folium.Map(tiles=None), slot)
+
+
+def build_opposition_grid(df_map, contested_points, restriction_points):
+    """
+    Opposition sources counted per HEATMAP_CELL_DEGREES grid cell.
+
+    One row per non-empty cell: the cell center (Latitude, Longitude) and the
+    number of BAD projects, MIXED projects, contested projects and local
+    restrictions in it. Contested projects and restrictions sit at their
+    county's centroid.
+    """
+    columns = list(OPPOSITION_WEIGHTS)
+    sentiment = df_map['Sentiment'] if 'Sentiment' in df_map.columns else pd.Series(None, index=df_map.index)
+    is_bad = (sentiment == 'BAD').to_numpy()
+    is_mixed = (sentiment == 'MIXED').to_numpy()
+    opposed = is_bad | is_mixed
+    sources = [
+        (df_map[opposed], {'BAD projects': is_bad[opposed], 'MIXED projects': is_mixed[opposed]}),
+        (contested_points, {'Contested projects': 1}),
+        (restriction_points, {'Local restrictions': 1})
+    ]
+
+    lat, lon, counts = [], [], []
+    for points, flags in sources:
+        if points is None or len(points) == 0:
+            continue
+        located = (points['Latitude'].notna() & points['Longitude'].notna()).to_numpy()
+        lat.append(points['Latitude'].to_numpy(dtype=float)[located])
+        lon.append(points['Longitude'].to_numpy(dtype=float)[located])
+        source_counts = pd.DataFrame(0, index=range(int(located.sum())), columns=columns)
+        for name, flag in flags.items():
+            source_counts[name] = np.broadcast_to(flag, located.shape)[located].astype(int)
+        counts.append(source_counts)
+    if not counts:
+        return pd.DataFrame(columns=['Latitude', 'Longitude'] + columns)
+    return grid_totals(np.concatenate(lat), np.concatenate(lon), pd.concat(counts, ignore_index=True), HEATMAP_CELL_DEGREES)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_opposition_grid(dataset_version, report_version, _df, _contested_points, _restriction_points):
+    """Opposition grid, aggregated once per dataset and report version"""
+    return build_opposition_grid(_df.dropna(subset=['Latitude', 'Longitude']), _contested_points, _restriction_points)
+
+
+def opposition_heat_points(grid, weights):
+    """[lat, lon, intensity] per grid cell: weighted source counts scaled to a 0-1 range"""
+    intensity = grid[list(weights)].to_numpy(dtype=float) @ np.array(list(weights.values()), dtype=float)
+    keep = intensity > 0
+    if not keep.any():
+        return []
+    intensity = intensity[keep] / intensity[keep].max()
+    return np.column_stack([grid['Latitude'].to_numpy()[keep], grid['Longitude'].to_numpy()[keep], intensity]).round(4).tolist()
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_heatmap_layer(dataset_version, report_version, weights, _grid):
+    """
+    Layer script of the opposition heatmap for one set of source weights.
+
+    `weights` are (source, weight) pairs and `_grid` the opposition grid of the
+    dataset and report version. Changing a weight only builds this layer; the
+    map under it stays cached. None when no cell has any weight.
+    """
+    heat_points = opposition_heat_points(_grid, dict(weights))
+    if not heat_points:
+        return None
+    layer = folium.FeatureGroup(name='Opposition Heatmap')
+    HeatMap(heat_points, min_opacity=0.3, radius=25, blur=20).add_to(layer)
+    return layer_script(layer, 'heatmap')
+
+
+def _mercator_pixels(lat, lon, zoom):
+    """Web Mercator pixel coordinates of points at a zoom level"""
+    scale = 256 * 2 ** zoom
+    x = (lon + 180) / 360 * scale
+    sin_lat = np.sin(np.radians(np.clip(lat, -85.0511, 85.0511)))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale
+    return x, y
+
+
+def build_zoom_clusters(df_map):
+    """
+    Grid clusters of the projects for every zoom level up to MAX_CLUSTER_ZOOM.
+
+    Points are bucketed into CLUSTER_RADIUS_PX-wide Web Mercator cells. Cells
+    halve in size with each zoom level, so every cluster splits into the
+    clusters of the next level. Each cluster has its member count, mean
+    position, count per sentiment and the position of its first project.
+    """
+    lat = df_map['Latitude'].to_numpy(dtype=float)
+    lon = df_map['Longitude'].to_numpy(dtype=float)
+    sentiment = df_map['Sentiment'].astype(object).fillna('NO DATA') if 'Sentiment' in df_map.columns \
+        else pd.Series('NO DATA', index=df_map.index)
+    points = pd.DataFrame({
+        'Latitude': lat,
+        'Longitude': lon,
+        'position': np.arange(len(df_map))
+    })
+    # One column per sentiment, summed per cluster
+    sentiment_flags = pd.get_dummies(pd.Categorical(sentiment, categories=list(SENTIMENT_COLORS)), dtype=np.int64)
+    sentiment_flags.index = points.index
+
+    levels = {}
+    for zoom in range(MAX_CLUSTER_ZOOM + 1):
+        x, y = _mercator_pixels(lat, lon, zoom)
+        cells = [np.floor(x / CLUSTER_RADIUS_PX).astype(np.int64), np.floor(y / CLUSTER_RADIUS_PX).astype(np.int64)]
+        grouped = points.groupby(cells, sort=False)
+        clusters = grouped.agg(
+            count=('position', 'size'),
+            Latitude=('Latitude', 'mean'),
+            Longitude=('Longitude', 'mean'),
+            position=('position', 'first')
+        )
+        sentiment_counts = sentiment_flags.groupby(cells, sort=False).sum()
+        levels[zoom] = pd.concat([clusters, sentiment_counts], axis=1).reset_index(drop=True)
+    return levels
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_zoom_clusters(dataset_version, _df):
+    """Per-zoom project clusters, computed once per dataset version"""
+    return build_zoom_clusters(_df.dropna(subset=['Latitude', 'Longitude']))
+
+
+def cluster_layer(clusters, df_map):
+    """Feature group with one bubble per cluster and a regular marker for single projects"""
+    layer = folium.FeatureGroup(name='Projects')
+    for cluster in clusters.to_dict('records'):
+        if cluster['count'] == 1:
+            project_marker(df_map.iloc[cluster['position']]).add_to(layer)
+            continue
+
+        # Bubble colored by the most common sentiment, sized by member count
+        counts = {name: cluster.get(name, 0) for name in SENTIMENT_COLORS}
+        majority = max(counts, key=counts.get)
+        size = int(30 + 10 * np.log10(cluster['count']))
+        summary = ", ".join(f"{count} {name.title()}" for name, count in counts.items() if count)
+        folium.Marker(
+            location=[cluster['Latitude'], cluster['Longitude']],
+            tooltip=f"{cluster['count']} projects ({summary}), zoom in to expand",
+            icon=folium.DivIcon(
+                icon_size=(size, size),
+                icon_anchor=(size // 2, size // 2),
+                html=f'<div style="width: {size}px; height: {size}px; line-height: {size}px; border-radius: 50%; '
+                     f'background: {SENTIMENT_COLORS[majority]}; opacity: 0.85; border: 2px solid white; '
+                     f'color: white; font-weight: bold; text-align: center; font-family: Arial, sans-serif;">{cluster["count"]}</div>'
+            )
+        ).add_to(layer)
+    return layer
+
+
+def _snap_bounds(bounds, grid):
+    """(south, west, north, east) widened outward to multiples of `grid` degrees"""
+    south, west, north, east = bounds
+    return (
+        float(np.floor(south / grid) * grid), float(np.floor(west / grid) * grid),
+        float(np.ceil(north / grid) * grid), float(np.ceil(east / grid) * grid)
+    )
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _get_cluster_layer(dataset_version, zoom, bounds, _df):
+    """Layer script of the cluster markers of one zoom level inside the bounds (all of them without bounds), built once per dataset version"""
+    if zoom > MAX_CLUSTER_ZOOM:
+        # Past the deepest level every project in view is shown on its own
+        index = get_project_index(dataset_version, _df)
+        positions = index.query_bbox(*bounds) if bounds else index.all()
+        layer = folium.FeatureGroup(name='Projects')
+        for idx, row in _df.iloc[positions].iterrows():
+            project_marker(row).add_to(layer)
+        return layer_script(layer, 'projects')
+
+    clusters = get_zoom_clusters(dataset_version, _df)[max(zoom, 0)]
+    if bounds:
+        south, west, north, east = bounds
+        clusters = clusters[clusters['Latitude'].between(south, north) & clusters['Longitude'].between(west, east)]
+    return layer_script(cluster_layer(clusters, _df.dropna(subset=['Latitude', 'Longitude'])), 'projects')
+
+
+def _view_bounds(zoom, bounds):
+    """
+    Viewport a marker layer is built for, or None without bounds.
+
+    The viewport is widened by one cluster cell (a cluster's center can sit just
+    outside the view while its projects are inside) and snapped outward to a
+    grid CLUSTER_VIEW_TILES map tiles wide, so that small pans reuse the layer.
+    """
+    if bounds is None:
+        return None
+    tile_degrees = 360 / 2 ** max(zoom, 0)
+    pad = tile_degrees * CLUSTER_RADIUS_PX / 256
+    south, west, north, east = bounds
+    padded = (south - pad, west - pad, north + pad, east + pad)
+    return _snap_bounds(padded, CLUSTER_VIEW_TILES * tile_degrees)
+
+
+def get_cluster_layer(dataset_version, zoom, bounds, df):
+    """Cluster markers for the current zoom and viewport (see _view_bounds)"""
+    return _get_cluster_layer(dataset_version, zoom, _view_bounds(zoom, bounds), df)
+
+
+def get_map_zoom(key):
+    """Zoom level the st_folium map with this key reported on the last interaction"""
+    zoom = (st.session_state.get(key) or {}).get('zoom')
+    return int(round(zoom)) if zoom is not None else MAP_ZOOM_START
+
+
+def get_map_bounds(key):
+    """(south, west, north, east) of the st_folium map's last reported viewport, or None"""
+    bounds = (st.session_state.get(key) or {}).get('bounds')
+    try:
+        return (bounds['_southWest']['lat'], bounds['_southWest']['lng'],
+                bounds['_northEast']['lat'], bounds['_northEast']['lng'])
+    except (KeyError, TypeError):
+        return None
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _get_viewport_layer(dataset_version, zoom, bounds, _df):
+    """
+    (layer script, summarized) of the projects inside the bounds (all of them without
+    bounds), built once per dataset version.
+
+    When more than VIEWPORT_MARKER_CAP projects are inside, the clusters of the
+    zoom level are drawn instead.
+    """
+    index = get_project_index(dataset_version, _df)
+    positions = index.query_bbox(*bounds) if bounds else index.all()
+
+    if len(positions) <= VIEWPORT_MARKER_CAP:
+        layer = folium.FeatureGroup(name='Projects')
+        for idx, row in _df.iloc[positions].iterrows():
+            project_marker(row).add_to(layer)
+        return layer_script(layer, 'projects'), False
+
+    clusters = get_zoom_clusters(dataset_version, _df)[min(max(zoom, 0), MAX_CLUSTER_ZOOM)]
+    if bounds:
+        south, west, north, east = bounds
+        clusters = clusters[clusters['Latitude'].between(south, north) & clusters['Longitude'].between(west, east)]
+    return layer_script(cluster_layer(clusters, _df.dropna(subset=['Latitude', 'Longitude'])), 'projects'), True
+
+
+def get_viewport_layer(dataset_version, zoom, bounds, df):
+    """
+    Markers of the projects inside the viewport: (layer script, projects in view, summarized).
+
+    The layer covers the viewport widened and snapped like the cluster layer
+    (see _view_bounds) and is cached per dataset version, zoom and snapped
+    bounds, so reruns and small pans reuse it; only the count of projects in
+    view is taken for the exact viewport.
+    """
+    index = get_project_index(dataset_version, df)
+    projects_in_view = len(index.query_bbox(*bounds) if bounds else index.all())
+    script, summarized = _get_viewport_layer(dataset_version, zoom, _view_bounds(zoom, bounds), df)
+    return script, projects_in_view, summarized
+
+
+@st.cache_resource(max_entries=2 * len(COUNTY_ZOOM_TIERS), show_spinner=False)
+def get_county_sentiment_features(spark_version, tier):
+    """
+    County features of a zoom tier joined with their SparkAI sentiment, and their bounds.
+
+    Only counties with a SparkAI report are kept. Built once per SparkAI data
+    version and tier, so panning and zooming within a tier is a bounds filter.
+    """
+    sentiment = load_spark_county_sentiment(spark_version)
+    labels = sentiment['County'] + ', ' + sentiment['State'] + ': ' + sentiment['Sentiment']
+    properties = dict(zip(sentiment['County ID'], (
+        {'County ID': county_id, 'Sentiment': value, 'Label': label}
+        for county_id, value, label in zip(sentiment['County ID'], sentiment['Sentiment'], labels)
+    )))
+    features = [
+        {'type': 'Feature', 'geometry': feature['geometry'], 'properties': properties[feature['properties']['County ID']]}
+        for feature in get_county_boundaries(tier)['features']
+        if feature['properties']['County ID'] in properties
+    ]
+    return features, feature_bounds(features)
+
+
+def county_sentiment_layer(features):
+    """SparkAI county sentiment as one GeoJSON layer in the county pane, colored in the browser"""
+    set_style = JsCode(f"""
+        function(feature, layer) {{
+            var colors = {json.dumps(SENTIMENT_COLORS)};
+            var color = colors[feature.properties.Sentiment] || colors['NO DATA'];
+            layer.setStyle({{color: color, weight: 0.5, fillColor: color, fillOpacity: 0.35}});
+        }}
+    """)
+    layer = folium.FeatureGroup(name='County Sentiment (SparkAI)')
+    folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        pane=COUNTY_PANE,
+        on_each_feature=set_style,
+        tooltip=folium.GeoJsonTooltip(fields=['Label'], labels=False) if features else None,
+        zoom_on_click=False
+    ).add_to(layer)
+    return layer
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _get_county_layer(spark_version, tier, bounds):
+    """Layer script of the county sentiment of a tier, limited to the counties overlapping the bounds (if any)"""
+    features, bounds_array = get_county_sentiment_features(spark_version, tier)
+    if bounds is not None:
+        south, west, north, east = bounds
+        in_view = (
+            (bounds_array[:, 0] <= north) & (bounds_array[:, 2] >= south) &
+            (bounds_array[:, 1] <= east) & (bounds_array[:, 3] >= west)
+        )
+        features = [features[i] for i in np.flatnonzero(in_view)]
+    return layer_script(county_sentiment_layer(features), 'counties')
+
+
+def get_county_layer(spark_version, zoom, bounds):
+    """
+    County sentiment layer for the current zoom and viewport.
+
+    The coarsest tier always covers the whole country; finer tiers only carry the
+    counties around the viewport (snapped outward to COUNTY_VIEW_GRID degrees).
+    """
+    tier = get_zoom_tier(zoom)
+    if tier == 0 or bounds is None:
+        return _get_county_layer(spark_version, tier, None)
+    return _get_county_layer(spark_version, tier, _snap_bounds(bounds, COUNTY_VIEW_GRID))
+
+
+def show_tracker_map(payload, layers=(), key=None, height=700, width=None, returned_objects=(),
+                     use_container_width=False):
+    """
+    Display a cached map payload with the st_folium component and return its value.
+
+    Nothing is rendered here: the payload comes from get_tracker_map and the
+    layers (the per-zoom clusters, the county layer) are layer scripts drawn on
+    top of it without reloading the map. As with st_folium, the last reported
+    value is also kept in st.session_state[key].
+    """
+    component_key = f"{key}_{payload['hash']}"
+
+    def keep_value():
+        if key is not None:
+            st.session_state[key] = st.session_state.get(component_key, {})
+
+    return _component_func(
+        script=payload['script'],
+        header=payload['header'],
+        html=payload['html'],
+        id=payload['id'],
+        key=component_key,
+        height=height,
+        width=None if use_container_width else width,
+        returned_objects=list(returned_objects),
+        default={name: payload['defaults'].get(name) for name in returned_objects},
+        zoom=None,
+        center=None,
+        feature_group=''.join(layers) or None,
+        return_on_hover=False,
+        layer_control=None,
+        pixelated=False,
+        css_links=payload['css_links'],
+        js_links=payload['js_links'],
+        on_change=keep_value,
+        wrap_longitude=False
+    )
+
+
+def get_clicked_project_id(map_data):
+    """Project_ID of the project whose marker was last clicked on the map, or None"""
+    if not map_data:
+        return None
+    # Markers and GeoJSON features carry the ID in their feature properties
+    clicked_feature = map_data.get('last_active_drawing') or {}
+    return (clicked_feature.get('properties') or {}).get('Project_ID')
+
+
+def _text_column(df, col, default):
+    """Column as strings with missing values (or a missing column) replaced by a default"""
+    if col not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    values = df[col].astype(object)
+    return values.where(values.notna() & (values != ''), default).astype(str)
+
+
+def _size_column(df, col, default):
+    """MW size column as text rounded to 2 decimals (non-numeric entries kept as written)"""
+    text = _text_column(df, col, default)
+    if col not in df.columns:
+        return text
+    sizes = pd.to_numeric(df[col], errors='coerce').astype('float64').round(2)
+    return text.where(sizes.isna(), sizes.map(str))
+
+
+def add_map_labels(df):
+    """
+    Add the marker tooltip and the details card HTML as columns of the project table.
+
+    Built once per dataset version with column-wise string concatenation, so map
+    renders and clicks only read the prepared strings.
+    """
+    project = _text_column(df, 'Project', 'Unknown')
+    sentiment = _text_column(df, 'Sentiment', 'NO DATA')
+    color = sentiment.map(SENTIMENT_COLORS).fillna(SENTIMENT_COLORS['NO DATA'])
+    notes = _text_column(df, 'Opposition_Notes', '')
+    notes_html = ('<hr style="margin: 10px 0;"><p style="margin: 0; font-size: 12px;"><b>Notes:</b> '
+                  + notes + '</p>').where(notes != '', '')
+    popup = (
+        '<div style="font-family: Arial, sans-serif; max-width: 420px;">'
+        '<h3 style="margin: 0 0 10px 0; color: #2c3e50;">' + project + '</h3>'
+        '<hr style="margin: 5px 0;">'
+        '<table style="width: 100%; font-size: 14px;">'
+        '<tr><td><b>Location:</b></td><td>' + _text_column(df, 'County', 'Unknown') + ', '
+        + _text_column(df, 'State', 'Unknown') + '</td></tr>'
+        '<tr><td><b>Type:</b></td><td>' + _text_column(df, 'Type', 'N/A') + '</td></tr>'
+        '<tr><td><b>Size:</b></td><td>' + _size_column(df, 'System Size (MW AC)', 'N/A') + ' MW</td></tr>'
+        '<tr><td><b>Sentiment:</b></td><td><span style="color: ' + color + '; font-weight: bold;">'
+        + sentiment + '</span></td></tr>'
+        '<tr><td><b>Status:</b></td><td>' + _text_column(df, 'Status', 'N/A') + '</td></tr>'
+        '</table>' + notes_html + '</div>'
+    )
+    return df.assign(Map_Tooltip=project + ' - ' + sentiment, Map_Popup=popup)